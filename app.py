@@ -1,92 +1,175 @@
 import logging
+from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
-import gettwitterposts
-import gettopproductsstate
-import gethashtags
-import getproductstrends
+from apscheduler.executors.pool import ThreadPoolExecutor
+from ratelimiter import google_trends_limiter
+from trendscache import trends_cache
+import botlogging
+import browserpool
+import jobdeadline
+import metrics
+import config
+import threading
 import time
-import os
+import uuid
 
+# Logger de cada robô; o campo job leva as mensagens também para botlogs/<task_name>.log
 def create_logger(task_name):
-    logger = logging.getLogger(task_name)
-    folder_logs = 'botlogs'
-    os.makedirs(folder_logs, exist_ok=True)
-    handler = logging.FileHandler(f'{folder_logs}/{task_name}.log', mode='a')
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
-    return logger
+    return logging.LoggerAdapter(logging.getLogger(task_name), {'job': task_name})
 
 # Loggers individuais
 logger_twitterposts = create_logger('gettwitterposts')
 logger_topproductsstate = create_logger('gettopproductsstate')
 logger_hashtags = create_logger('gethashtags')
 logger_productstrends = create_logger('getproductstrends')
+logger_tiktokvideos = create_logger('gettiktokvideos')
+logger_hashtagsemalta = create_logger('hashtagsemalta')
+logger_twitterstream = create_logger('twitterstream')
 
-# Funções que executam as tarefas
-def run_gettwitterposts():
-    logger_twitterposts.info("Executando gettwitterposts...")
-    try:
+# Executa um job com prazo, registrando duração e resultado nas métricas
+def executar_job(nome, funcao, logger):
+    # Todas as mensagens da execução (de qualquer módulo) levam o job e um identificador da execução
+    with botlogging.log_context(job=nome, run_id=uuid.uuid4().hex[:8]):
+        logger.info(f"Executando {nome}...")
+        inicio = time.perf_counter()
+        status = 'ok'
+        try:
+            jobdeadline.run_with_deadline(nome, config.PRAZO_JOBS[nome], funcao)
+            logger.info(f"{nome} executado com sucesso.")
+        except Exception as e:
+            status = 'deadline' if isinstance(e, jobdeadline.DeadlineExceeded) else 'error'
+            logger.error(f"Erro ao executar {nome}: {e}")
+        finally:
+            metrics.observe('cb_job_duration_seconds', {'job': nome}, time.perf_counter() - inicio)
+            metrics.inc('cb_job_runs_total', {'job': nome, 'status': status})
+            metrics.dump_json(config.METRICS_JSON_FILE)
+
+def log_google_trends_stats(logger):
+    logger.info(f"Limitador do Google Trends: {google_trends_limiter.stats()}")
+    logger.info(f"Cache do Google Trends: {trends_cache.stats()}")
+
+# Funções que executam as tarefas; cada módulo de job só é importado quando o job roda pela primeira vez
+
+# A cada ciclo de tweets, as hashtags e termos dos tweets novos atualizam o all_trends;
+# no modo stream os tweets já chegam continuamente e o ciclo só recalcula os termos
+def coletar_tweets_e_termos():
+    import tweetterms
+
+    if config.TWITTER_MODO != 'stream':
+        import gettwitterposts
         gettwitterposts.buscar_tweets_e_mencoes()
-        logger_twitterposts.info("gettwitterposts executado com sucesso.")
-    except Exception as e:
-        logger_twitterposts.error(f"Erro ao executar gettwitterposts: {e}")
+    tweetterms.execute_tweet_terms()
+
+def run_gettwitterposts():
+    executar_job('gettwitterposts', coletar_tweets_e_termos, logger_twitterposts)
 
 def run_gettopproductsstate():
-    logger_topproductsstate.info("Executando gettopproductsstate...")
-    try:
-        gettopproductsstate.execute_getproductsstate()
-        logger_topproductsstate.info("gettopproductsstate executado com sucesso.")
-    except Exception as e:
-        logger_topproductsstate.error(f"Erro ao executar gettopproductsstate: {e}")
+    import gettopproductsstate
+
+    executar_job('gettopproductsstate', gettopproductsstate.execute_getproductsstate, logger_topproductsstate)
+    log_google_trends_stats(logger_topproductsstate)
 
 def run_gethashtags():
-    logger_hashtags.info("Executando gethashtags...")
-    try:
-        gethashtags.execute_get_hashtags()
-        logger_hashtags.info("gethashtags executado com sucesso.")
-    except Exception as e:
-        logger_hashtags.error(f"Erro ao executar gethashtags: {e}")
+    import gethashtags
+
+    executar_job('gethashtags', gethashtags.execute_get_hashtags, logger_hashtags)
+    log_google_trends_stats(logger_hashtags)
 
 def run_getproductstrends():
-    logger_productstrends.info("Executando getproductstrends...")
-    try:
-        getproductstrends.execute_getproducts_trends()
-        logger_productstrends.info("getproductstrends executado com sucesso.")
-    except Exception as e:
-        logger_productstrends.error(f"Erro ao executar getproductstrends: {e}")
+    import getproductstrends
 
-if __name__ == "__main__":
-    # Executar as tarefas uma vez no início
-    logger_twitterposts.info("Executando gettwitterposts pela primeira vez ao iniciar.")
-    run_gettwitterposts()
+    executar_job('getproductstrends', getproductstrends.execute_getproducts_trends, logger_productstrends)
+    log_google_trends_stats(logger_productstrends)
+
+# O loop asyncio da coleta roda na thread do executor 'tiktok', sem prender o agendador
+def run_gettiktokvideos():
+    import gettiktokvideos
+
+    executar_job('gettiktokvideos', gettiktokvideos.execute_get_tiktok_videos, logger_tiktokvideos)
+
+# Disparada pela mudança no topo das tendências, só para as hashtags que entraram
+def run_hashtags_em_alta(hashtags):
+    import gettwitterposts
+
+    executar_job('hashtagsemalta', lambda: gettwitterposts.buscar_hashtags_em_alta(hashtags), logger_hashtagsemalta)
+
+# Modo stream: a conexão com o filtered stream fica em uma thread própria, fora do agendador
+def start_twitter_stream(stop_event):
+    import twitterstream
+
+    def run():
+        with botlogging.log_context(job='twitterstream'):
+            try:
+                twitterstream.run_stream(stop_event=stop_event)
+            except Exception as e:
+                logger_twitterstream.error(f"Stream do Twitter encerrado com erro: {e}")
 
-    logger_topproductsstate.info("Executando gettopproductsstate pela primeira vez ao iniciar.")
-    run_gettopproductsstate()
+    thread = threading.Thread(target=run, name='twitter-stream', daemon=True)
+    thread.start()
+    return thread
 
-    logger_hashtags.info("Executando gethashtags pela primeira vez ao iniciar.")
-    run_gethashtags()
+# Cria o agendador com um pool de threads por classe de job, para que um job lento não segure os outros
+def create_scheduler():
+    executors = {
+        'default': ThreadPoolExecutor(1),
+        'twitter': ThreadPoolExecutor(config.THREADS_POR_CLASSE['twitter']),
+        'trends': ThreadPoolExecutor(config.THREADS_POR_CLASSE['trends']),
+        'browser': ThreadPoolExecutor(config.THREADS_POR_CLASSE['browser']),
+        'tiktok': ThreadPoolExecutor(config.THREADS_POR_CLASSE['tiktok']),
+    }
+    job_defaults = {
+        # Execuções atrasadas se juntam em uma só e nunca rodam duas instâncias do mesmo job
+        'coalesce': True,
+        'max_instances': 1,
+        'misfire_grace_time': 5 * 60,
+    }
+    return BackgroundScheduler(executors=executors, job_defaults=job_defaults)
 
-    logger_productstrends.info("Executando getproductstrends pela primeira vez ao iniciar.")
-    run_getproductstrends()
+# Modo serviço: agenda todos os jobs e mantém o processo no ar até ser interrompido
+def serve():
+    # Todos os módulos gravam pela fila de logs, em uma única thread
+    botlogging.configure_logging()
+
+    # Endpoint local de métricas no formato Prometheus
+    metrics.start_http_server(config.METRICS_PORT)
+    # Saídas publicadas servidas da memória, atualizadas a cada publicação dos jobs
+    if config.READ_API_ATIVA:
+        import readapi
+        readapi.start_http_server(config.READ_API_PORT)
 
     # Inicializa o agendador
-    scheduler = BackgroundScheduler()
+    scheduler = create_scheduler()
+
+    # Agendar as tarefas; todas rodam uma vez logo ao iniciar, em paralelo
+    agora = datetime.now()
+    scheduler.add_job(run_gettwitterposts, 'interval', minutes=15, id='gettwitterposts',
+                      executor='twitter', next_run_time=agora)
+    # Os jobs de produtos verificam a agenda com frequência e só consultam os termos vencidos
+    scheduler.add_job(run_gettopproductsstate, 'interval', minutes=config.TRENDS_AGENDA_VERIFICACAO,
+                      id='gettopproductsstate', executor='trends', next_run_time=agora)
+    scheduler.add_job(run_gethashtags, 'interval', minutes=60, id='gethashtags',
+                      executor='browser', next_run_time=agora)
+    scheduler.add_job(run_getproductstrends, 'interval', minutes=config.TRENDS_AGENDA_VERIFICACAO,
+                      id='getproductstrends', executor='trends', next_run_time=agora)
+    scheduler.add_job(run_gettiktokvideos, 'interval', minutes=30, id='gettiktokvideos',
+                      executor='tiktok', next_run_time=agora)
 
-    # Agendar as tarefas
-    scheduler.add_job(run_gettwitterposts, 'interval', minutes=15)
-    scheduler.add_job(run_gettopproductsstate, 'interval', minutes=60)
-    scheduler.add_job(run_gethashtags, 'interval', minutes=60)
-    scheduler.add_job(run_getproductstrends, 'interval', minutes=30)
+    # Cada publicação do all_trends com hashtags novas no topo agenda uma busca de tweets para elas
+    import trendchain
+    trend_chain = trendchain.TrendChain(scheduler, run_hashtags_em_alta)
 
     # Iniciar o agendador
     scheduler.start()
+    trend_chain.start()
+
+    stream_stop = threading.Event()
+    stream_thread = start_twitter_stream(stream_stop) if config.TWITTER_MODO == 'stream' else None
 
     logger_twitterposts.info("Robô iniciado - gettwitterposts")
     logger_topproductsstate.info("Robô iniciado - gettopproductsstate")
     logger_hashtags.info("Robô iniciado - gethashtags")
     logger_productstrends.info("Robô iniciado - getproductstrends")
+    logger_tiktokvideos.info("Robô iniciado - gettiktokvideos")
 
     # Manter o script em execução
     try:
@@ -97,4 +180,14 @@ if __name__ == "__main__":
         logger_topproductsstate.info("Encerrando o robô - gettopproductsstate...")
         logger_hashtags.info("Encerrando o robô - gethashtags...")
         logger_productstrends.info("Encerrando o robô - getproductstrends...")
+        logger_tiktokvideos.info("Encerrando o robô - gettiktokvideos...")
+        stream_stop.set()
+        trend_chain.stop()
         scheduler.shutdown()
+        if stream_thread is not None:
+            stream_thread.join()
+        browserpool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    serve()
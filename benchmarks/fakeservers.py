@@ -0,0 +1,389 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Estados na ordem em que o Google Trends devolve o mapa do Brasil
+ESTADOS = {
+    "BR-AC": "Acre", "BR-AL": "Alagoas", "BR-AP": "Amapá", "BR-AM": "Amazonas", "BR-BA": "Bahia",
+    "BR-CE": "Ceará", "BR-DF": "Distrito Federal", "BR-ES": "Espírito Santo", "BR-GO": "Goiás",
+    "BR-MA": "Maranhão", "BR-MT": "Mato Grosso", "BR-MS": "Mato Grosso do Sul", "BR-MG": "Minas Gerais",
+    "BR-PA": "Pará", "BR-PB": "Paraíba", "BR-PR": "Paraná", "BR-PE": "Pernambuco", "BR-PI": "Piauí",
+    "BR-RJ": "Rio de Janeiro", "BR-RN": "Rio Grande do Norte", "BR-RS": "Rio Grande do Sul",
+    "BR-RO": "Rondônia", "BR-RR": "Roraima", "BR-SC": "Santa Catarina", "BR-SP": "São Paulo",
+    "BR-SE": "Sergipe", "BR-TO": "Tocantins",
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_FOLDER, name), 'rb') as f:
+        return f.read()
+
+
+# Valor estável entre execuções para um termo (e opcionalmente uma região/ponto)
+def stable_value(*parts, maximum=100):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % (maximum + 1)
+
+
+class FakeService:
+    """
+    Servidor HTTP local que simula um serviço externo, com latência configurável,
+    429 injetados e contagem das requisições recebidas.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0, jitter=0.0, throttle_rate=0.0, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'throttled': self.throttled}
+
+    # Registra a requisição, aplica a latência e decide se ela deve receber um 429
+    def _admit(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            throttle = self._random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if delay > 0:
+            time.sleep(delay)
+        return not throttle
+
+    def handle(self, handler, method):
+        raise NotImplementedError
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_DELETE(self):
+                self._dispatch('DELETE')
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.body = self.rfile.read(length) if length else b''
+                if not service._admit():
+                    service.send_throttled(self)
+                    return
+                service.handle(self, method)
+
+        return Handler
+
+    def send_throttled(self, handler):
+        self.send(handler, 429, b'Too Many Requests', 'text/html')
+
+    @staticmethod
+    def send(handler, status, body, content_type, headers=None):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class FakeTrends24(FakeService):
+    """ Reproduz a página gravada do trends24 para qualquer região. """
+
+    name = 'trends24'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.page = load_fixture('trends24_brazil.html')
+
+    def handle(self, handler, method):
+        if urlparse(handler.path).path.startswith('/brazil'):
+            self.send(handler, 200, self.page, 'text/html; charset=utf-8')
+        else:
+            self.send(handler, 404, b'Not Found', 'text/html')
+
+
+class FakeGoogleTrends(FakeService):
+    """
+    Simula os endpoints usados pelo pytrends: cookie, explore (tokens), multiline,
+    comparedgeo e pesquisas em alta. Os valores são derivados de forma estável de cada termo.
+    """
+
+    name = 'google_trends'
+    TIMELINE_POINTS = 168
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.trending = load_fixture('google_trending_searches.json')
+
+    def send_json(self, handler, payload, prefix=''):
+        body = (prefix + json.dumps(payload, ensure_ascii=False)).encode('utf-8')
+        self.send(handler, 200, body, 'application/json; charset=utf-8')
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path
+
+        if path.endswith('/explore/'):
+            self.send(handler, 200, b'<html></html>', 'text/html',
+                      headers={'Set-Cookie': 'NID=fake-cookie; Path=/'})
+        elif path.endswith('/api/explore'):
+            self.send_json(handler, self._widgets(json.loads(params['req'])), prefix=")]}'")
+        elif path.endswith('/api/widgetdata/multiline'):
+            self.send_json(handler, self._timeline(json.loads(params['req'])), prefix=")]}',\n")
+        elif path.endswith('/api/widgetdata/comparedgeo'):
+            self.send_json(handler, self._geo_map(json.loads(params['req'])), prefix=")]}',\n")
+        elif path.endswith('/hottrends/visualize/internal/data'):
+            self.send(handler, 200, self.trending, 'application/json; charset=utf-8')
+        else:
+            self.send(handler, 404, b'Not Found', 'text/html')
+
+    @staticmethod
+    def _widgets(request):
+        items = request['comparisonItem']
+        widget_request = {
+            'keywords': [item['keyword'] for item in items],
+            'time': items[0]['time'] if items else '',
+            'geo': items[0]['geo'] if items else '',
+        }
+        return {'widgets': [
+            {'id': 'TIMESERIES', 'token': 'fake-timeseries', 'request': dict(widget_request)},
+            {'id': 'GEO_MAP', 'token': 'fake-geo', 'request': dict(widget_request)},
+        ]}
+
+    def _timeline(self, request):
+        keywords = request['keywords']
+        start = int(time.time()) // 3600 * 3600 - self.TIMELINE_POINTS * 3600
+        points = []
+        for index in range(self.TIMELINE_POINTS):
+            point = {
+                'time': str(start + index * 3600),
+                'value': [stable_value(keyword, request['time'], index) for keyword in keywords],
+                'hasData': [True] * len(keywords),
+            }
+            if index == self.TIMELINE_POINTS - 1:
+                point['isPartial'] = True
+            points.append(point)
+        return {'default': {'timelineData': points, 'averages': []}}
+
+    @staticmethod
+    def _geo_map(request):
+        keywords = request['keywords']
+        data = []
+        for geo_code, geo_name in ESTADOS.items():
+            values = [stable_value(keyword, geo_code) for keyword in keywords]
+            data.append({
+                'geoCode': geo_code,
+                'geoName': geo_name,
+                'value': values,
+                'formattedValue': [str(value) for value in values],
+                'maxValueIndex': values.index(max(values)),
+                'hasData': [True] * len(keywords),
+            })
+        return {'default': {'geoMapData': data}}
+
+
+class FakeTwitterApi(FakeService):
+    """
+    Simula a busca recente da API v2: paginação por next_token, since_id,
+    expansão de autores e cabeçalhos x-rate-limit-*. Também simula o filtered stream:
+    regras em /2/tweets/search/stream/rules e uma resposta chunked com um tweet por linha,
+    keep-alives e a conexão encerrada pelo servidor depois de alguns tweets.
+    """
+
+    name = 'twitter'
+    TWITTER_EPOCH_MS = 1288834974657
+    RATE_LIMIT = 450
+    WINDOW_SECONDS = 900
+
+    def __init__(self, tweets_per_query=250, stream_interval=0.01, stream_tweets_per_connection=200, **kwargs):
+        super().__init__(**kwargs)
+        self.stream_interval = stream_interval
+        self.stream_tweets_per_connection = stream_tweets_per_connection
+        self.rules = {}
+        self.stream_connections = 0
+        self._stream_sent = 0
+        self.templates = json.loads(load_fixture('twitter_tweets.json'))
+        self.tweets_per_query = tweets_per_query
+        self._window_start = time.time()
+        self._window_used = 0
+        # IDs "snowflake" de tweets criados agora, estáveis enquanto o servidor estiver no ar
+        self.first_id = (int(time.time() * 1000) - self.TWITTER_EPOCH_MS) << 22
+
+    def _rate_limit_headers(self):
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= self.WINDOW_SECONDS:
+                self._window_start = now
+                self._window_used = 0
+            self._window_used += 1
+            remaining = max(0, self.RATE_LIMIT - self._window_used)
+            reset = int(self._window_start + self.WINDOW_SECONDS)
+        return {'x-rate-limit-limit': str(self.RATE_LIMIT),
+                'x-rate-limit-remaining': str(remaining),
+                'x-rate-limit-reset': str(reset)}
+
+    def send_throttled(self, handler):
+        # Um 429 com reset próximo, para o cliente esperar pouco no benchmark
+        reset = int(time.time()) + 1
+        self.send(handler, 429, b'{"title":"Too Many Requests"}', 'application/json',
+                  headers={'x-rate-limit-remaining': '0', 'x-rate-limit-reset': str(reset)})
+
+    # Tweets da consulta, do mais novo para o mais antigo
+    def _tweets_for(self, query):
+        offset = stable_value(query, maximum=1000)
+        tweets = []
+        for index in range(self.tweets_per_query):
+            template = self.templates[(offset + index) % len(self.templates)]
+            tweet_id = self.first_id + offset * 100000 + index
+            tweets.append({
+                'id': str(tweet_id),
+                'author_id': str(stable_value(template['username'], maximum=10 ** 9)),
+                'username': template['username'],
+                'text': template['text'],
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+            })
+        return list(reversed(tweets))
+
+    def _handle_rules(self, handler, method):
+        if method == 'POST':
+            request = json.loads(handler.body or b'{}')
+            with self._lock:
+                for rule in request.get('add', []):
+                    rule_id = str(stable_value(rule['value'], rule.get('tag'), maximum=10 ** 12))
+                    self.rules[rule_id] = {'id': rule_id, 'value': rule['value'], 'tag': rule.get('tag')}
+                for rule_id in request.get('delete', {}).get('ids', []):
+                    self.rules.pop(rule_id, None)
+            payload = {'meta': {'sent': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())}}
+        else:
+            with self._lock:
+                payload = {'data': list(self.rules.values()), 'meta': {'result_count': len(self.rules)}}
+        self.send(handler, 200, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    @staticmethod
+    def _write_chunk(handler, data):
+        handler.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        handler.wfile.flush()
+
+    # Um tweet novo por vez, revezando entre as regras ativas
+    def _next_stream_message(self):
+        with self._lock:
+            rules = list(self.rules.values())
+            if not rules:
+                return None
+            sequence = self._stream_sent
+            self._stream_sent += 1
+        rule = rules[sequence % len(rules)]
+        template = self.templates[sequence % len(self.templates)]
+        author_id = str(stable_value(template['username'], maximum=10 ** 9))
+        # IDs acima dos da busca recente, para não coincidir com os tweets já coletados por ela
+        tweet = {'id': str(self.first_id + 200_000_000 + sequence), 'author_id': author_id,
+                 'text': template['text'], 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())}
+        return {'data': tweet, 'includes': {'users': [{'id': author_id, 'username': template['username']}]},
+                'matching_rules': [{'id': rule['id'], 'tag': rule['tag']}]}
+
+    def _handle_stream(self, handler):
+        with self._lock:
+            self.stream_connections += 1
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json; charset=utf-8')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        try:
+            for index in range(self.stream_tweets_per_connection):
+                message = self._next_stream_message()
+                # Sem regras o stream só manda keep-alives
+                self._write_chunk(handler, b"\r\n" if message is None else
+                                  json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\r\n")
+                if index % 10 == 9:
+                    self._write_chunk(handler, b"\r\n")
+                time.sleep(self.stream_interval)
+            # Encerra a resposta; o cliente precisa reconectar
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        handler.close_connection = True
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        if url.path == '/2/tweets/search/stream/rules':
+            self._handle_rules(handler, method)
+            return
+        if url.path == '/2/tweets/search/stream':
+            self._handle_stream(handler)
+            return
+        if url.path != '/2/tweets/search/recent':
+            self.send(handler, 404, b'{"title":"Not Found"}', 'application/json')
+            return
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        tweets = self._tweets_for(params.get('query', ''))
+        if params.get('since_id'):
+            tweets = [tweet for tweet in tweets if int(tweet['id']) > int(params['since_id'])]
+
+        start = int(params.get('next_token') or 0)
+        size = int(params.get('max_results') or 10)
+        page = tweets[start:start + size]
+
+        meta = {'result_count': len(page)}
+        if page:
+            meta['newest_id'] = page[0]['id']
+            meta['oldest_id'] = page[-1]['id']
+        if start + size < len(tweets):
+            meta['next_token'] = str(start + size)
+
+        payload = {'meta': meta}
+        if page:
+            payload['data'] = [{key: tweet[key] for key in ('id', 'author_id', 'text', 'created_at')}
+                               for tweet in page]
+            users = {tweet['author_id']: tweet['username'] for tweet in page}
+            payload['includes'] = {'users': [{'id': user_id, 'username': username}
+                                             for user_id, username in users.items()]}
+
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send(handler, 200, body, 'application/json; charset=utf-8', headers=self._rate_limit_headers())
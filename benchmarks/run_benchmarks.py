@@ -0,0 +1,190 @@
+"""
+Benchmark de ponta a ponta dos coletores contra servidores locais que reproduzem
+o trends24, o Google Trends (pytrends) e a API v2 do Twitter.
+
+Uso: python -m benchmarks.run_benchmarks [--jobs ...] [--latency 0.05] [--throttle-rate 0.1] [--repeat 2]
+                                         [--trends-workers 4]
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fakeservers import FakeGoogleTrends, FakeTrends24, FakeTwitterApi  # noqa: E402
+
+# Job -> (módulo, função, arquivos de saída contados como linhas produzidas)
+JOBS = {
+    'gethashtags': ('gethashtags', 'execute_get_hashtags',
+                    ['static/words_tsv_in/all_trends.tsv', 'static/words_tsv_in/trends24/*.tsv']),
+    'getproductstrends': ('getproductstrends', 'execute_getproducts_trends',
+                          ['static/trending_products_folder_in/*.tsv']),
+    'gettopproductsstate': ('gettopproductsstate', 'execute_getproductsstate',
+                            ['static/map_tsv_in/item_mais_procurado_por_regiao.tsv']),
+    'gettwitterposts': ('gettwitterposts', 'buscar_tweets_e_mencoes',
+                        ['static/social/x_tsv_in/*.tsv', 'hashtags_tweets.tsv']),
+    'twitterstream': ('twitterstream', 'run_stream',
+                      ['static/social/x_tsv_in/*.tsv', 'hashtags_tweets.tsv']),
+}
+
+# Argumentos de jobs que não terminam sozinhos
+JOB_KWARGS = {
+    'twitterstream': {'max_seconds': 5},
+}
+
+
+def count_rows(workdir, patterns):
+    rows = 0
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(workdir, pattern)):
+            with open(path, encoding='utf-8') as f:
+                rows += max(0, sum(1 for _ in f) - 1)
+    return rows
+
+
+# Aponta a configuração do processo para a pasta de trabalho e os serviços simulados
+def _configure(workdir, urls, limiter_interval, use_queue):
+    os.chdir(workdir)
+    os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+
+    import config
+    config.TRENDS24_BASE_URL = urls['trends24']
+    config.GOOGLE_TRENDS_BASE_URL = urls['google_trends']
+    config.TWITTER_API_BASE_URL = urls['twitter']
+    config.GOOGLE_TRENDS_INTERVALO_INICIAL = limiter_interval
+    config.GOOGLE_TRENDS_INTERVALO_MINIMO = min(limiter_interval, 0.01)
+    config.TRENDS_FILA_ATIVA = use_queue
+    config.TRENDS_FILA_INTERVALO = 0.05
+    config.TWITTER_STREAM_GRAVACAO = 1
+
+    import botlogging
+    botlogging.configure_logging(f"benchmark_{os.getpid()}")
+
+
+# Worker da fila do Google Trends, com limitador próprio (como se saísse por outro IP)
+def _run_trends_worker(workdir, urls, limiter_interval, worker_id):
+    _configure(workdir, urls, limiter_interval, True)
+    import trendsworker
+    trendsworker.run_trends_worker(worker_id)
+
+
+# Executado em um processo separado: cada job tem importações, memória e estado próprios
+def _run_job(job, workdir, urls, limiter_interval, use_queue, result_queue):
+    _configure(workdir, urls, limiter_interval, use_queue)
+
+    module_name, function_name, _ = JOBS[job]
+    module = __import__(module_name)
+
+    started = time.perf_counter()
+    error = None
+    try:
+        getattr(module, function_name)(**JOB_KWARGS.get(job, {}))
+    except Exception as e:
+        error = repr(e)
+    wall_time = time.perf_counter() - started
+
+    result_queue.put({
+        'wall_time_s': round(wall_time, 3),
+        # ru_maxrss é em KB no Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'error': error,
+    })
+
+
+def run_benchmarks(jobs, latency, jitter, throttle_rate, limiter_interval, repeat, trends_workers=0):
+    services = {
+        'trends24': FakeTrends24(latency=latency, jitter=jitter).start(),
+        'google_trends': FakeGoogleTrends(latency=latency, jitter=jitter, throttle_rate=throttle_rate).start(),
+        'twitter': FakeTwitterApi(latency=latency, jitter=jitter, throttle_rate=throttle_rate).start(),
+    }
+    urls = {
+        'trends24': services['trends24'].base_url,
+        'google_trends': f"{services['google_trends'].base_url}/trends",
+        'twitter': services['twitter'].base_url,
+    }
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='cb_bench_') as workdir:
+            # As repetições usam a mesma pasta, então medem também o efeito de cache e cursores
+            for run in range(1, repeat + 1):
+                for job in jobs:
+                    for service in services.values():
+                        service.reset_counters()
+
+                    workers = [context.Process(target=_run_trends_worker,
+                                               args=(workdir, urls, limiter_interval, f"bench-{index}"), daemon=True)
+                               for index in range(trends_workers)]
+                    for worker in workers:
+                        worker.start()
+
+                    result_queue = context.Queue()
+                    process = context.Process(target=_run_job,
+                                              args=(job, workdir, urls, limiter_interval, trends_workers > 0,
+                                                    result_queue))
+                    process.start()
+                    result = result_queue.get()
+                    process.join()
+                    for worker in workers:
+                        worker.terminate()
+                        worker.join()
+
+                    result.update({
+                        'job': job,
+                        'run': run,
+                        'requests': {name: service.stats() for name, service in services.items()},
+                        'rows': count_rows(workdir, JOBS[job][2]),
+                    })
+                    results.append(result)
+    finally:
+        for service in services.values():
+            service.stop()
+    return results
+
+
+def print_report(results):
+    header = f"{'job':<22}{'run':>4}{'wall(s)':>10}{'requests':>10}{'429s':>6}{'rss(MB)':>9}{'rows':>7}  erro"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        requests = sum(stats['requests'] for stats in result['requests'].values())
+        throttled = sum(stats['throttled'] for stats in result['requests'].values())
+        print(f"{result['job']:<22}{result['run']:>4}{result['wall_time_s']:>10.2f}{requests:>10}"
+              f"{throttled:>6}{result['peak_rss_mb']:>9.1f}{result['rows']:>7}  {result['error'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos coletores contra serviços locais simulados.")
+    parser.add_argument("--jobs", nargs="+", choices=sorted(JOBS), default=list(JOBS),
+                        help="Jobs a executar.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência fixa por requisição (s).")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Latência aleatória adicional (s).")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Fração das requisições ao Google Trends e ao Twitter respondidas com 429.")
+    parser.add_argument("--limiter-interval", type=float, default=0.05,
+                        help="Intervalo inicial do limitador do Google Trends (s).")
+    parser.add_argument("--trends-workers", type=int, default=0,
+                        help="Processos worker da fila do Google Trends (0 = consultas em sequência no job).")
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções de cada job na mesma pasta de trabalho.")
+    parser.add_argument("--json", type=str, help="Arquivo para salvar os resultados em JSON.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.jobs, args.latency, args.jitter, args.throttle_rate,
+                             args.limiter_interval, args.repeat, args.trends_workers)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+import metrics
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s%(context)s'
+
+# Campos de contexto anexados a cada registro, na ordem em que aparecem na linha
+CONTEXT_FIELDS = ('job', 'run_id', 'estado', 'termo')
+
+# Contexto da thread atual (job, execução, estado, termo)
+_local = threading.local()
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    previous = getattr(_local, 'context', {})
+    _local.context = dict(previous, **{name: value for name, value in fields.items() if value is not None})
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+
+# Envolve a função para que ela rode em outra thread com o mesmo contexto de log da thread atual
+def propagate(func):
+    context = getattr(_local, 'context', {})
+
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'context', {})
+        _local.context = context
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.context = previous
+
+    return wrapper
+
+
+class ContextFilter(logging.Filter):
+    """ Copia o contexto da thread que gerou o registro para os atributos do próprio registro. """
+
+    def filter(self, record):
+        context = getattr(_local, 'context', {})
+        for field in CONTEXT_FIELDS:
+            # Valores passados explicitamente (extra=, LoggerAdapter) têm prioridade
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field))
+        values = [f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+                  if getattr(record, field) is not None]
+        record.context = f" [{' '.join(values)}]" if values else ''
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """ Entrega o registro à fila sem esperar; com a fila cheia, o registro é descartado e contado. """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('cb_log_dropped_total')
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    # No encerramento a fila pode estar cheia: espera espaço para o aviso de parada em vez de falhar
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def _compress(source, destination):
+    with open(source, 'rb') as f_in, gzip.open(destination, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class RotatingCompressedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotaciona o arquivo por tamanho ou por idade, o que vier primeiro, e guarda as cópias
+    antigas comprimidas (arquivo.log.1.gz, ...), até backup_count cópias.
+    """
+
+    def __init__(self, filename, max_bytes, max_age, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        self.opened_at = time.time()
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = _compress
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        return (time.time() - self.opened_at >= self.max_age
+                and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+
+class JobFileRouter(logging.Handler):
+    """ Grava também os registros de cada job em botlogs/<job>.log, um arquivo (rotacionado) por job. """
+
+    def __init__(self, folder, create_handler):
+        super().__init__()
+        self.folder = folder
+        self.create_handler = create_handler
+        self._handlers = {}
+
+    def emit(self, record):
+        job = getattr(record, 'job', None)
+        if not job:
+            return
+        handler = self._handlers.get(job)
+        if handler is None:
+            handler = self._handlers[job] = self.create_handler(os.path.join(self.folder, f"{job}.log"))
+        handler.handle(record)
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        super().close()
+
+
+# Níveis por módulo: config.LOG_NIVEIS, sobrescritos pela variável LOG_NIVEIS ("modulo=NIVEL,...")
+def configured_levels():
+    levels = dict(config.LOG_NIVEIS)
+    for item in os.environ.get('LOG_NIVEIS', '').split(','):
+        name, _, level = item.partition('=')
+        if level:
+            levels[name.strip()] = level.strip()
+    return levels
+
+
+def apply_levels(levels):
+    for name, level in levels.items():
+        logging.getLogger(name or None).setLevel(level.upper())
+
+
+# Liga todos os loggers do processo à fila; uma única thread grava no console e nos arquivos.
+# process_name dá nome ao arquivo principal (botlogs/<process_name>.log)
+def configure_logging(process_name='robos', console=True):
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(config.LOG_FOLDER, exist_ok=True)
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        def file_handler(path):
+            handler = RotatingCompressedFileHandler(path, config.LOG_TAMANHO_MAXIMO, config.LOG_IDADE_MAXIMA,
+                                                    config.LOG_ARQUIVOS_MANTIDOS)
+            handler.setFormatter(formatter)
+            return handler
+
+        handlers = [file_handler(os.path.join(config.LOG_FOLDER, f"{process_name}.log")),
+                    JobFileRouter(config.LOG_FOLDER, file_handler)]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+
+        log_queue = queue.Queue(config.LOG_FILA_MAXIMO)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        apply_levels(configured_levels())
+
+        _listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+# Grava o que ainda estiver na fila e fecha os arquivos
+def shutdown_logging():
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
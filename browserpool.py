@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import botlogging
+import config
+from jobdeadline import propagate, register_cleanup, unregister_cleanup
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chrome headless de longa duração: cada sessão é verificada antes do uso
+    e reciclada depois de um número máximo de páginas.
+    """
+
+    def __init__(self, size, max_pages):
+        self.size = size
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._driver_path = None
+        self._closed = False
+
+    def _create_browser(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        # O chromedriver é resolvido uma única vez por processo
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+
+        options = Options()
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        driver = webdriver.Chrome(service=Service(self._driver_path), options=options)
+        logger.info("Novo navegador criado no pool.")
+        return _PooledBrowser(driver)
+
+    @staticmethod
+    def _is_healthy(browser):
+        try:
+            return browser.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            logger.warning(f"Erro ao encerrar navegador do pool: {e}")
+
+    def _acquire(self):
+        self._slots.acquire()
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    return self._create_browser()
+                except Exception:
+                    self._slots.release()
+                    raise
+            if self._is_healthy(browser):
+                return browser
+            logger.warning("Navegador do pool não respondeu; descartando.")
+            self._discard(browser)
+
+    def _release(self, browser, broken=False):
+        browser.pages += 1
+        if broken or self._closed or browser.pages >= self.max_pages:
+            self._discard(browser)
+        else:
+            self._idle.put(browser)
+        self._slots.release()
+
+    # Empresta um navegador do pool; se o job estourar o prazo, o navegador é encerrado
+    @contextmanager
+    def session(self):
+        browser = self._acquire()
+        register_cleanup(browser.driver.quit)
+        broken = False
+        try:
+            yield browser.driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            unregister_cleanup(browser.driver.quit)
+            self._release(browser, broken=broken)
+
+    # Executa func(driver, item) para cada item em paralelo, um navegador do pool por vez em cada thread
+    def map(self, func, items):
+        def run(item):
+            with self.session() as driver:
+                return func(driver, item)
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(botlogging.propagate(propagate(run)), items))
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Pool único do processo, criado no primeiro uso
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(config.BROWSER_POOL_SIZE, config.BROWSER_POOL_MAX_PAGINAS)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,134 @@
+"""
+Linha de comando única dos robôs: um subcomando por job e o modo serviço (agendador).
+
+Uso: python cli.py serve
+     python cli.py gettwitterposts --username casasbahia --hashtags blackfriday
+     python cli.py trends-worker --proxy https://proxy:3128
+
+Os módulos de cada job (e as dependências pesadas: pandas, pytrends, selenium, TikTokApi)
+só são importados quando o subcomando correspondente roda.
+"""
+import argparse
+import os
+import sys
+
+import botlogging
+
+
+def run_serve(args):
+    import app
+    app.serve()
+
+
+def run_gethashtags(args):
+    import gethashtags
+    gethashtags.execute_get_hashtags()
+
+
+def run_getproductstrends(args):
+    import getproductstrends
+    getproductstrends.execute_getproducts_trends()
+
+
+def run_gettopproductsstate(args):
+    import gettopproductsstate
+    gettopproductsstate.execute_getproductsstate()
+
+
+def run_gettwitterposts(args):
+    import gettwitterposts
+    gettwitterposts.buscar_tweets_e_mencoes(args.username, args.hashtags, args.max_results)
+
+
+def run_backfill(args):
+    import gettwitterposts
+    gettwitterposts.backfill_tweets_e_mencoes(args.username, args.hashtags, args.max_pages, args.start_time)
+
+
+def run_stream(args):
+    import twitterstream
+    twitterstream.run_stream(args.username, args.hashtags)
+
+
+def run_gettiktokvideos(args):
+    import gettiktokvideos
+    gettiktokvideos.execute_get_tiktok_videos(args.hashtags, args.contas)
+
+
+def run_tweetterms(args):
+    import tweetterms
+    tweetterms.execute_tweet_terms()
+
+
+def run_trends_worker(args):
+    import trendsworker
+    trendsworker.run_trends_worker(args.id, args.proxy, args.sair_ocioso)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Robôs de coleta de tendências.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("serve", help="Agenda e executa todos os jobs.").set_defaults(func=run_serve)
+    subparsers.add_parser("gethashtags", help="Tendências do trends24 e do Google Trends.").set_defaults(
+        func=run_gethashtags)
+    subparsers.add_parser("getproductstrends", help="Interesse por categoria de produtos.").set_defaults(
+        func=run_getproductstrends)
+    subparsers.add_parser("gettopproductsstate", help="Item mais procurado por estado.").set_defaults(
+        func=run_gettopproductsstate)
+    subparsers.add_parser("tweetterms", help="Hashtags e termos dos tweets coletados.").set_defaults(
+        func=run_tweetterms)
+
+    # Mesmos parâmetros do script gettwitterposts.py, declarados aqui para não importar o módulo
+    twitter = subparsers.add_parser("gettwitterposts", help="Menções e tweets com hashtags.")
+    twitter.add_argument("--username", type=str, default="casasbahia", help="Usuário para buscar menções.")
+    twitter.add_argument("--hashtags", nargs="+", type=str, default=["blackfriday"],
+                         help="Lista de hashtags para buscar tweets.")
+    twitter.add_argument("--max_results", type=int, default=40, help="Máximo de resultados (entre 10 e 100).")
+    twitter.set_defaults(func=run_gettwitterposts)
+
+    backfill = subparsers.add_parser("backfill", help="Backfill da busca recente, página a página, com retomada.")
+    backfill.add_argument("--username", type=str, default="casasbahia", help="Usuário para buscar menções.")
+    backfill.add_argument("--hashtags", nargs="+", type=str, default=["blackfriday"],
+                          help="Lista de hashtags para buscar tweets.")
+    backfill.add_argument("--max-pages", type=int, help="Páginas por consulta nesta execução (padrão: sem limite).")
+    backfill.add_argument("--start-time", type=str, help="Início da janela (ISO 8601, ex.: 2024-11-29T00:00:00Z).")
+    backfill.set_defaults(func=run_backfill)
+
+    stream = subparsers.add_parser("stream", help="Menções e hashtags pelo filtered stream (conexão persistente).")
+    stream.add_argument("--username", type=str, default="casasbahia", help="Usuário para receber menções.")
+    stream.add_argument("--hashtags", nargs="+", type=str, default=["blackfriday"],
+                        help="Lista de hashtags para receber tweets.")
+    stream.set_defaults(func=run_stream)
+
+    tiktok = subparsers.add_parser("gettiktokvideos", help="Vídeos do TikTok de hashtags e contas.")
+    tiktok.add_argument("--hashtags", nargs="+", type=str,
+                        help="Hashtags a buscar (padrão: topo do all_trends.tsv).")
+    tiktok.add_argument("--contas", nargs="+", type=str, help="Contas a buscar (padrão: config.TIKTOK_CONTAS).")
+    tiktok.set_defaults(func=run_gettiktokvideos)
+
+    worker = subparsers.add_parser("trends-worker", help="Worker da fila de consultas ao Google Trends.")
+    worker.add_argument("--id", type=str, help="Identificação do worker (padrão: host-pid).")
+    worker.add_argument("--proxy", action="append", help="Proxy HTTPS do worker (pode repetir).")
+    worker.add_argument("--sair-ocioso", type=float, help="Encerra após tantos segundos sem trabalho.")
+    worker.set_defaults(func=run_trends_worker)
+    return parser
+
+
+# Nome do arquivo de log principal de cada subcomando; workers simultâneos não dividem o mesmo arquivo
+def log_name(args):
+    if args.command == "serve":
+        return "robos"
+    if args.command == "trends-worker":
+        return f"trendsworker_{args.id or os.getpid()}"
+    return args.command
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    botlogging.configure_logging(log_name(args))
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
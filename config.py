@@ -10,3 +10,190 @@ MAP_TSV_FOLDER_IN = 'static/map_tsv_in'
 TOP_PRODUCTS_FOLDER_IN = 'static/top_products_tsv_in'
 
 TRENDING_PRODUCTS_FOLDER_IN = 'static/trending_products_folder_in'
+
+# Endereço base do Google Trends usado pelo pytrends (pode apontar para um servidor local de testes)
+GOOGLE_TRENDS_BASE_URL = 'https://trends.google.com/trends'
+# Termo fixo repetido em todas as consultas do Google Trends para colocar os lotes na mesma escala
+GOOGLE_TRENDS_ANCHOR = 'Casas Bahia'
+# Intervalos (em segundos) entre requisições ao Google Trends; o limitador ajusta o valor entre o mínimo e o máximo
+GOOGLE_TRENDS_INTERVALO_INICIAL = 10
+GOOGLE_TRENDS_INTERVALO_MINIMO = 2
+GOOGLE_TRENDS_INTERVALO_MAXIMO = 300
+# Tentativas por requisição quando o Google Trends responde 429
+GOOGLE_TRENDS_TENTATIVAS = 4
+
+# Pasta com arquivos de estado dos robôs (cache, cursores, progresso)
+STATE_FOLDER = 'botstate'
+
+# Cache em disco das respostas do Google Trends
+TRENDS_CACHE_DB = f'{STATE_FOLDER}/pytrends_cache.sqlite'
+TRENDS_CACHE_MAX_ENTRADAS = 5000
+# Validade (em segundos) das respostas em cache, por timeframe consultado
+TRENDS_CACHE_TTL = {
+    'now 1-H': 5 * 60,
+    'now 4-H': 10 * 60,
+    'now 1-d': 30 * 60,
+    # Pontos de hora em hora; a agenda por palavra-chave decide quando vale consultar de novo
+    'now 7-d': 50 * 60,
+    'today 1-m': 6 * 60 * 60,
+    'today 3-m': 12 * 60 * 60,
+    'today 12-m': 24 * 60 * 60,
+    'today 5-y': 7 * 24 * 60 * 60,
+}
+TRENDS_CACHE_TTL_PADRAO = 60 * 60
+
+# Fila (SQLite) de lotes do Google Trends para processos worker; desativada, o job consulta os lotes em sequência
+TRENDS_FILA_ATIVA = False
+TRENDS_FILA_DB = f'{STATE_FOLDER}/trends_queue.sqlite'
+# Tempo (em segundos) que um worker pode segurar um lote antes que outro possa assumi-lo
+TRENDS_FILA_LEASE = 10 * 60
+TRENDS_FILA_TENTATIVAS = 3
+# Intervalo (em segundos) entre verificações da fila
+TRENDS_FILA_INTERVALO = 0.5
+# O job coordenador também processa lotes enquanto espera, para não depender de workers no ar
+TRENDS_FILA_COORDENADOR_PROCESSA = True
+
+# Agenda de atualização por palavra-chave dos jobs de produtos: termos voláteis são consultados com mais
+# frequência e termos estáveis dobram o intervalo a cada consulta sem mudança, dentro do orçamento por hora
+TRENDS_AGENDA_DB = f'{STATE_FOLDER}/trends_agenda.sqlite'
+TRENDS_AGENDA_LOTES_POR_HORA = 30
+TRENDS_AGENDA_INTERVALO_MINIMO = 60 * 60
+TRENDS_AGENDA_INTERVALO_INICIAL = 2 * 60 * 60
+TRENDS_AGENDA_INTERVALO_MAXIMO = 24 * 60 * 60
+# Variação relativa (da pontuação ou do desvio padrão sobre a média) a partir da qual o termo é volátil
+TRENDS_AGENDA_LIMIAR = 0.15
+# Peso da consulta mais recente na média e na variância exponenciais
+TRENDS_AGENDA_SUAVIZACAO = 0.3
+# Intervalo (em minutos) em que os jobs de produtos verificam quais termos venceram
+TRENDS_AGENDA_VERIFICACAO = 15
+
+# Histórico (append-only) das pontuações de todas as coletas
+HISTORY_DB = f'{STATE_FOLDER}/history.sqlite'
+
+# Tempo máximo (em segundos) de cada execução agendada antes de ser cancelada
+PRAZO_JOBS = {
+    'gettwitterposts': 10 * 60,
+    'gettopproductsstate': 55 * 60,
+    'gethashtags': 30 * 60,
+    'getproductstrends': 25 * 60,
+    'gettiktokvideos': 25 * 60,
+    'hashtagsemalta': 10 * 60,
+}
+# Threads por classe de job no agendador
+THREADS_POR_CLASSE = {
+    'twitter': 1,
+    'trends': 2,
+    'browser': 1,
+    'tiktok': 1,
+}
+
+# Regiões do trends24 coletadas a cada execução (nome -> caminho na página)
+TRENDS24_BASE_URL = 'https://trends24.in'
+TRENDS24_REGIONS = {
+    'brazil': 'brazil/',
+    'sao-paulo': 'brazil/sao-paulo/',
+    'rio-de-janeiro': 'brazil/rio-de-janeiro/',
+    'belo-horizonte': 'brazil/belo-horizonte/',
+    'brasilia': 'brazil/brasilia/',
+    'salvador': 'brazil/salvador/',
+    'fortaleza': 'brazil/fortaleza/',
+    'recife': 'brazil/recife/',
+    'curitiba': 'brazil/curitiba/',
+    'porto-alegre': 'brazil/porto-alegre/',
+    'manaus': 'brazil/manaus/',
+    'belem': 'brazil/belem/',
+}
+TRENDS24_TSV_FOLDER_IN = 'static/words_tsv_in/trends24'
+
+# Pool de navegadores headless reaproveitados entre as execuções
+BROWSER_POOL_SIZE = 3
+# Cada navegador é reciclado depois de carregar este número de páginas
+BROWSER_POOL_MAX_PAGINAS = 50
+
+# Endereço base da API v2 do Twitter
+TWITTER_API_BASE_URL = 'https://api.twitter.com'
+# Cursores (since_id) das buscas do Twitter, para cada execução trazer só tweets novos
+TWITTER_CURSORS_FILE = f'{STATE_FOLDER}/twitter_cursors.json'
+# Máximo de páginas (next_token) por busca em uma execução
+TWITTER_MAX_PAGINAS = 10
+# Tentativas por requisição à API do Twitter em erros temporários (conexão, 5xx, 429)
+TWITTER_TENTATIVAS = 4
+# Abaixo deste número de requisições restantes na janela, as chamadas passam a ser espaçadas até o reset
+TWITTER_RESERVA_REQUISICOES = 20
+# Checkpoints (por consulta) do backfill da busca recente
+TWITTER_BACKFILL_FOLDER = f'{STATE_FOLDER}/twitter_backfill'
+# Checkpoints (por consulta) da busca periódica interrompida antes da última página
+TWITTER_PAGINACAO_FOLDER = f'{STATE_FOLDER}/twitter_paginacao'
+# Índice dos tweets já gravados; a busca recente cobre 7 dias, então IDs mais antigos que isso podem ser esquecidos
+TWITTER_DEDUP_FOLDER = f'{STATE_FOLDER}/tweet_ids'
+TWITTER_DEDUP_RETENCAO = 8 * 24 * 60 * 60
+# Coleta de tweets: 'busca' (busca recente a cada ciclo) ou 'stream' (conexão persistente com o filtered stream)
+TWITTER_MODO = 'busca'
+# Intervalo (em segundos) entre as gravações em lote dos tweets recebidos pelo stream
+TWITTER_STREAM_GRAVACAO = 5
+# O stream manda um keep-alive a cada 20s; sem nada por este tempo a conexão é considerada caída
+TWITTER_STREAM_TIMEOUT_LEITURA = 90
+
+# Busca de tweets disparada quando o topo das tendências (twitter/google) do all_trends muda
+TENDENCIAS_TOP = 10
+# Espera (em segundos) depois da última mudança antes de buscar; mudanças seguidas viram uma só busca
+TENDENCIAS_ESPERA = 60
+# Máximo de hashtags novas buscadas por disparo; as demais ficam para a coleta seguinte
+TENDENCIAS_MAX_BUSCAS = 5
+# Páginas da busca recente por hashtag nova
+TENDENCIAS_PAGINAS = 1
+TENDENCIAS_STATE_FILE = f'{STATE_FOLDER}/hashtags_em_alta.json'
+
+# Hashtags e termos de produtos extraídos dos tweets coletados, somados em uma janela deslizante
+TWEET_TERMS_ARQUIVOS = [f'{X_TSV_FOLDER_IN}/*.tsv', 'hashtags_tweets.tsv']
+TWEET_TERMS_STATE_FILE = f'{STATE_FOLDER}/tweet_terms.json'
+TWEET_TERMS_JANELA = 24 * 60 * 60
+TWEET_TERMS_BALDE = 15 * 60
+# Termos com pelo menos esse número de tweets na janela entram no all_trends, até o limite
+TWEET_TERMS_MINIMO = 2
+TWEET_TERMS_TOP = 50
+
+# Logs: uma thread grava os registros de todos os módulos; cada arquivo é rotacionado por tamanho ou idade
+# e as cópias antigas ficam comprimidas
+LOG_FOLDER = 'botlogs'
+LOG_TAMANHO_MAXIMO = 10 * 1024 * 1024
+LOG_IDADE_MAXIMA = 24 * 60 * 60
+LOG_ARQUIVOS_MANTIDOS = 7
+# Registros aguardando gravação; com a fila cheia os novos são descartados em vez de travar os jobs
+LOG_FILA_MAXIMO = 10000
+# Nível por módulo ('' é o padrão); a variável de ambiente LOG_NIVEIS="modulo=NIVEL,..." sobrescreve
+LOG_NIVEIS = {
+    '': 'INFO',
+    'apscheduler': 'WARNING',
+    'urllib3': 'WARNING',
+    'selenium': 'WARNING',
+    'asyncio': 'WARNING',
+}
+
+# Métricas: endpoint local no formato Prometheus e cópia em JSON após cada execução
+METRICS_PORT = 9108
+METRICS_JSON_FILE = f'{LOG_FOLDER}/metrics.json'
+# API de leitura das saídas publicadas, servidas da memória do processo do agendador
+READ_API_ATIVA = True
+READ_API_PORT = 9110
+# Respostas menores que isto não são comprimidas
+READ_API_GZIP_MINIMO = 1024
+# Respostas prontas (por parâmetros) mantidas em memória para cada saída
+READ_API_RESPOSTAS_POR_SAIDA = 32
+
+# Publicação dos arquivos de saída: manifesto com versão/hash de cada arquivo e deltas por publicação
+PUBLISH_MANIFEST = 'static/manifest.json'
+PUBLISH_DELTAS = True
+PUBLISH_DELTAS_FOLDER = 'static/deltas'
+# Deltas mantidos por arquivo (os mais antigos são apagados)
+PUBLISH_DELTAS_MANTIDOS = 50
+
+# Coleta de vídeos do TikTok: sessões simultâneas, intervalo mínimo entre usos de cada sessão (s)
+TIKTOK_SESSOES = 3
+TIKTOK_INTERVALO_SESSAO = 2
+TIKTOK_VIDEOS_POR_ALVO = 30
+# Hashtags do topo do all_trends.tsv buscadas a cada execução, além das contas acompanhadas
+TIKTOK_HASHTAGS_TOP = 10
+TIKTOK_CONTAS = ['casasbahia']
+# Linhas acumuladas antes de cada gravação nos TSVs do TikTok
+TIKTOK_LINHAS_POR_GRAVACAO = 50
@@ -1,31 +1,33 @@
-import csv
 import time
 import logging
 import pandas as pd
-from pytrends.request import TrendReq
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementClickInterceptedException
+import lxml.html
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 
+import botlogging
+import browserpool
 import config
+import historystore
+import httpsession
+import metrics
+import publisher
+import trendsplanner
 
-# Configuração do logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Origens das linhas do all_trends no histórico
+ORIGENS_PLATAFORMAS = ("twitter", "google")
+ORIGEM_TWEETS = "tweets"
+
 # Função para combinar os dados em um único DataFrame e salvar como TSV
 def combine_and_save_trends(twitter_data, google_data):
     logger.info("Combinando dados de todas as plataformas...")
 
     # Convertendo os dados em DataFrames
-    twitter_df = pd.DataFrame(twitter_data, columns=["Hashtag", "Contagem"])
-    google_df = google_data  # Já é um DataFrame
+    twitter_df = pd.DataFrame(twitter_data, columns=["Hashtag", "Contagem"]).assign(Origem="twitter")
+    google_df = google_data.assign(Origem="google")  # Já é um DataFrame
 
     # Concatenando os DataFrames
     combined_df = pd.concat([twitter_df, google_df], ignore_index=True)
@@ -33,8 +35,43 @@ def combine_and_save_trends(twitter_data, google_data):
     # Convertendo a coluna "Contagem" para numérico (se necessário)
     combined_df['Contagem'] = pd.to_numeric(combined_df['Contagem'], errors='coerce').fillna(0)
 
-    # Ordenando por "Contagem" em ordem decrescente
-    combined_df = combined_df.sort_values(by="Contagem", ascending=False)
+    # Grava a execução no histórico; o TSV é gerado a partir do que foi gravado
+    historystore.history_store.append(
+        historystore.ALL_TRENDS, combined_df, 'Hashtag', 'Contagem', scope_column='Origem')
+    publish_all_trends()
+
+# Grava as contagens de hashtags e termos dos nossos tweets como terceira fonte do all_trends
+def save_tweet_terms(terms_df):
+    historystore.history_store.append(
+        historystore.ALL_TRENDS, terms_df, 'Hashtag', 'Contagem', scope=ORIGEM_TWEETS)
+    publish_all_trends()
+
+# Tendências da última coleta das plataformas (twitter e google)
+def latest_platform_trends(ultimas=None):
+    if ultimas is None:
+        ultimas = historystore.history_store.latest(historystore.ALL_TRENDS)
+    plataformas = ultimas[ultimas['scope'].isin(ORIGENS_PLATAFORMAS)]
+    return plataformas[plataformas['run_at'] == plataformas['run_at'].max()]
+
+
+# Hashtags do topo da última coleta das plataformas, no formato aceito pela busca do Twitter
+def top_platform_hashtags(limit):
+    plataformas = latest_platform_trends().sort_values('value', ascending=False, kind='stable')
+    termos = plataformas['term'].str.lstrip('#').str.replace(r'\s+', '', regex=True)
+    termos = termos[termos.str.fullmatch(r'\w+')]
+    return termos.drop_duplicates().head(limit).tolist()
+
+
+# Gera o all_trends.tsv: última coleta das plataformas (trends24 + Google) e a última janela dos tweets
+def publish_all_trends():
+    ultimas = historystore.history_store.latest(historystore.ALL_TRENDS)
+    plataformas = latest_platform_trends(ultimas)
+    tweets = ultimas[ultimas['scope'] == ORIGEM_TWEETS]
+
+    combined_df = pd.concat([plataformas, tweets], ignore_index=True)
+    combined_df = combined_df.sort_values('value', ascending=False, kind='stable')
+    combined_df = combined_df.rename(columns={'term': 'Hashtag', 'value': 'Contagem'})[["Hashtag", "Contagem"]]
+    combined_df['Contagem'] = combined_df['Contagem'].round().astype(int)
 
     output_folder = config.WORD_TSV_FOLDER_IN
 
@@ -42,106 +79,176 @@ def combine_and_save_trends(twitter_data, google_data):
 
     # Salvando em um arquivo TSV
     tsv_filename = os.path.join(output_folder, "all_trends.tsv")
-    combined_df.to_csv(tsv_filename, sep='\t', index=False)
+    publisher.publish_frame(combined_df, tsv_filename, key_columns=["Hashtag"])
 
     logger.info(f"Dados combinados salvos em {tsv_filename}.")
 
-# Função para extrair tendências do Twitter usando Selenium
-def get_twitter_trends(url):
-    logger.info("Iniciando extração de tendências do Twitter...")
-    service = Service(ChromeDriverManager().install())
-    options = Options()
-    driver = webdriver.Chrome(service=service, options=options)
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-
+# Conexões simultâneas ao trends24 na coleta por região
+TRENDS24_CONEXOES = 4
+
+# Sessão HTTP reaproveitada entre as execuções para buscar o trends24 sem abrir o navegador
+http_session = None
+# As regiões são buscadas em paralelo: a sessão é criada uma única vez, sob o lock
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    global http_session
+    with _http_session_lock:
+        if http_session is None:
+            http_session = httpsession.create_session(pool_size=TRENDS24_CONEXOES, retries=2,
+                                                      headers={'User-Agent': httpsession.BROWSER_USER_AGENT})
+    return http_session
+
+# Função para salvar as tendências do Twitter em TSV
+def save_twitter_trends(trends, csv_filename="twitter_trends.tsv"):
+    # Salvar em CSV com tabulação
+    publisher.publish_rows(["Hashtags", "Contagem"], trends, csv_filename, key_columns=["Hashtags"])
+    logger.info(f"Tendências salvas em {csv_filename}.")
+
+# Função para extrair as tendências da tabela do trends24 a partir do HTML da página
+def parse_twitter_trends_html(page_html):
+    # O trends24 é servido em UTF-8; sem o parser explícito o lxml assume latin-1 para bytes
+    document = lxml.html.fromstring(page_html, parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+    # Mesmos seletores do caminho com Selenium: td.topic e td.count de cada linha da tabela
+    trends = []
+    for row in document.xpath("//tr[td[contains(concat(' ', normalize-space(@class), ' '), ' topic ')]]"):
+        topic = row.xpath("./td[contains(concat(' ', normalize-space(@class), ' '), ' topic ')]")[0]
+        count = row.xpath("./td[contains(concat(' ', normalize-space(@class), ' '), ' count ')]")
+        count_text = count[0].text_content().strip() if count else ''
+        formatted_count = count_text.replace('.', '').replace(',', '')  # Remove pontos e vírgulas
+        trends.append([topic.text_content().strip(), formatted_count])
+    return trends
+
+# Função para extrair tendências do Twitter via HTTP, sem navegador
+def get_twitter_trends_http(url):
+    started = time.perf_counter()
+    try:
+        response = get_http_session().get(url, timeout=15)
+    except Exception:
+        metrics.record_request('trends24', 'page', 'error', time.perf_counter() - started)
+        raise
+    metrics.record_request('trends24', 'page', response.status_code, time.perf_counter() - started)
+    response.raise_for_status()
+    return parse_twitter_trends_html(response.content)
+
+# Função para extrair as tendências de uma página do trends24 já aberta no navegador
+def extract_twitter_trends_from_driver(driver, url):
+    # O Selenium só é importado quando o navegador é realmente usado
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+    started = time.perf_counter()
     try:
         driver.get(url)
-        logger.info("Página do Twitter Trends carregada.")
-
-        # Verifica e fecha possíveis pop-ups sobrepondo a página
-        try:
-            logger.info("Verificando pop-ups na página...")
-            overlay_close_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Fechar' or contains(@class, 'close')]"))
-            )
-            overlay_close_button.click()
-            logger.info("Pop-up fechado com sucesso.")
-        except (TimeoutException, NoSuchElementException):
-            logger.info("Nenhum pop-up encontrado.")
-
-        # Usa JavaScript para forçar o clique no botão
-        try:
-            logger.info("Procurando botão de navegação...")
-            button = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "tab-link-table"))
-            )
-            driver.execute_script("arguments[0].scrollIntoView(true);", button)
-            driver.execute_script("arguments[0].click();", button)
-            logger.info("Botão clicado com sucesso.")
-        except TimeoutException:
-            logger.error("Botão de navegação não encontrado.")
-            return []
-
-        # Espera até que os elementos com os tópicos estejam visíveis
-        logger.info("Esperando que os tópicos sejam carregados...")
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_all_elements_located((By.CSS_SELECTOR, "td.topic a"))
-        )
-
-        topic_elements = driver.find_elements(By.CSS_SELECTOR, "td.topic")
-        count_elements = driver.find_elements(By.CSS_SELECTOR, "td.count")
-
-        trends = []
-        for count, topic in zip(count_elements, topic_elements):
-            formatted_count = count.text.replace('.', '').replace(',', '')  # Remove pontos e vírgulas
-            trends.append([topic.text, formatted_count])
+    except Exception:
+        metrics.record_request('selenium', 'page_load', 'error', time.perf_counter() - started)
+        raise
+    metrics.record_request('selenium', 'page_load', 200, time.perf_counter() - started)
+    logger.info("Página do Twitter Trends carregada.")
 
-        logger.info(f"Tendências extraídas: {len(trends)} itens encontrados.")
-
-        # Salvar em CSV com tabulação
-        csv_filename = "twitter_trends.tsv"
-        with open(csv_filename, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file, delimiter='\t')
-            writer.writerow(["Hashtags", "Contagem"])
-            writer.writerows(trends)
+    # Verifica e fecha possíveis pop-ups sobrepondo a página
+    try:
+        logger.info("Verificando pop-ups na página...")
+        overlay_close_button = WebDriverWait(driver, 5).until(
+            EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Fechar' or contains(@class, 'close')]"))
+        )
+        overlay_close_button.click()
+        logger.info("Pop-up fechado com sucesso.")
+    except (TimeoutException, NoSuchElementException):
+        logger.info("Nenhum pop-up encontrado.")
 
-        logger.info(f"Tendências salvas em {csv_filename}.")
-        return trends if trends else []
+    # Usa JavaScript para forçar o clique no botão
+    try:
+        logger.info("Procurando botão de navegação...")
+        button = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.ID, "tab-link-table"))
+        )
+        driver.execute_script("arguments[0].scrollIntoView(true);", button)
+        driver.execute_script("arguments[0].click();", button)
+        logger.info("Botão clicado com sucesso.")
+    except TimeoutException:
+        logger.error("Botão de navegação não encontrado.")
+        return []
+
+    # Espera até que os elementos com os tópicos estejam visíveis
+    logger.info("Esperando que os tópicos sejam carregados...")
+    WebDriverWait(driver, 10).until(
+        EC.visibility_of_all_elements_located((By.CSS_SELECTOR, "td.topic a"))
+    )
+
+    topic_elements = driver.find_elements(By.CSS_SELECTOR, "td.topic")
+    count_elements = driver.find_elements(By.CSS_SELECTOR, "td.count")
+
+    trends = []
+    for count, topic in zip(count_elements, topic_elements):
+        formatted_count = count.text.replace('.', '').replace(',', '')  # Remove pontos e vírgulas
+        trends.append([topic.text, formatted_count])
+
+    return trends
+
+# Função auxiliar para a coleta por região: falhas viram lista vazia para não derrubar as demais regiões
+def _try_get_region_trends(get_trends, *args):
+    try:
+        return get_trends(*args)
+    except Exception as e:
+        logger.warning(f"Falha ao obter tendências de {args[-1]}: {e}")
+        return []
+
+# Função para coletar várias regiões do trends24 em paralelo e salvar um TSV por região
+def get_twitter_trends_by_region(regions=None, output_folder=config.TRENDS24_TSV_FOLDER_IN):
+    regions = regions or config.TRENDS24_REGIONS
+    urls = {region: f"{config.TRENDS24_BASE_URL}/{path}" for region, path in regions.items()}
+    logger.info(f"Coletando tendências do trends24 para {len(urls)} regiões...")
+
+    # Caminho rápido: todas as páginas via HTTP, em paralelo
+    with ThreadPoolExecutor(max_workers=TRENDS24_CONEXOES) as executor:
+        results = dict(zip(urls, executor.map(
+            botlogging.propagate(lambda url: _try_get_region_trends(get_twitter_trends_http, url)), urls.values())))
+
+    # Só as regiões que falharam vão para os navegadores do pool
+    pending = [region for region, trends in results.items() if not trends]
+    if pending:
+        logger.warning(f"Usando o navegador para as regiões: {', '.join(pending)}")
+        browser_results = browserpool.get_pool().map(
+            lambda driver, url: _try_get_region_trends(extract_twitter_trends_from_driver, driver, url),
+            [urls[region] for region in pending])
+        results.update(zip(pending, browser_results))
 
-    finally:
-        logger.info("Fechando o navegador do Twitter Trends.")
-        driver.quit()
+    os.makedirs(output_folder, exist_ok=True)
+    for region, trends in results.items():
+        if trends:
+            save_twitter_trends(trends, os.path.join(output_folder, f"{region}.tsv"))
+        else:
+            logger.error(f"Nenhuma tendência obtida para a região {region}.")
+    return results
 
 # Função para extrair tendências do Google Trends usando pytrends
 def get_google_trends():
     logger.info("Iniciando extração de tendências do Google Trends...")
 
-    pytrends = TrendReq(hl='pt-BR', tz=360)
-    logger.info("API do pytrends configurada com sucesso.")
-
     try:
         logger.info("Obtendo tendências diárias do Google Trends...")
-        trends = pytrends.trending_searches(pn='brazil')
+        trends = trendsplanner.trending_searches(pn='brazil').copy()
         trends.columns = ['Hashtag']
 
-        contagens = []
+        # Consulta todas as tendências em lotes, já na mesma escala
+        logger.info(f"Consultando dados de interesse ao longo do tempo para {len(trends)} tendências.")
+        interest = trendsplanner.fetch_interest(trends['Hashtag'].tolist(), timeframe='now 1-d', geo='BR')
 
+        contagens = []
         for hashtag in trends['Hashtag']:
-            logger.info(f"Consultando dados de interesse ao longo do tempo para: {hashtag}")
-            pytrends.build_payload([hashtag], cat=0, timeframe='now 1-d', geo='BR')
-            interest = pytrends.interest_over_time()
-
-            if not interest.empty:
-                last_value = interest[hashtag].iloc[-1]
-                contagens.append(last_value)
+            if not interest.empty and hashtag in interest.columns:
+                contagens.append(round(interest[hashtag].iloc[-1]))
             else:
                 contagens.append(0)
 
         trends['Contagem'] = contagens
 
         tsv_filename = "google_trends.tsv"
-        trends.to_csv(tsv_filename, sep='\t', index=False)
+        publisher.publish_frame(trends, tsv_filename, key_columns=["Hashtag"])
         logger.info(f"Tendências salvas em {tsv_filename}.")
 
         return trends
@@ -152,12 +259,14 @@ def get_google_trends():
 
 # Função principal para execução
 def execute_get_hashtags():
-    twitter_url = 'https://trends24.in/brazil/'
-
-    twitter_trends_data = get_twitter_trends(twitter_url)
+    # O Brasil alimenta o all_trends; as cidades ganham seus próprios arquivos
+    trends_por_regiao = get_twitter_trends_by_region()
+    twitter_trends_data = trends_por_regiao.get('brazil', [])
+    if twitter_trends_data:
+        save_twitter_trends(twitter_trends_data)
     google_trends_data = get_google_trends()
 
-    if twitter_trends_data is not None:
+    if twitter_trends_data:
         if google_trends_data is None or google_trends_data.empty:
             logger.warning("Dados do Google Trends estão ausentes ou vazios. Continuando com dados do Twitter apenas.")
             google_trends_data = pd.DataFrame(columns=["Hashtag", "Contagem"])
@@ -170,4 +279,5 @@ def execute_get_hashtags():
 
 # Executar a função principal
 if __name__ == "__main__":
+    botlogging.configure_logging("gethashtags")
     execute_get_hashtags()
@@ -1,73 +1,79 @@
 import logging
 import pandas as pd
-from pytrends.request import TrendReq
 import os
-import time
 
+import botlogging
 import config
+import historystore
+import publisher
+import trendsplanner
+from refreshplanner import refresh_planner
 
-# Configuração do logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Função principal para coletar dados de tendências com base em uma categoria escolhida
-def fetch_trends_by_category(category, products):
-    logger.info(f"Extraindo dados de tendências para a categoria: {category}")
-
-    # Configuração da API do Google Trends
-    pytrends = TrendReq(hl='pt-BR', tz=360)
-    timeframe = 'now 7-d'  # Última semana
-
-    # Coleta de dados de tendências para os produtos
+# Função para calcular a média de interesse de cada produto a partir da série já normalizada
+def summarize_interest(products, interest_data):
     trends_data = []
     for product in products:
-        logger.info(f"Coletando dados para o produto: {product}")
-        pytrends.build_payload([product], timeframe=timeframe, geo='BR')
-        interest_data = pytrends.interest_over_time()
-
-        if not interest_data.empty:
+        if not interest_data.empty and product in interest_data.columns:
             avg_interest = round(interest_data[product].mean())
             trends_data.append([product, avg_interest])
-            logger.info(f"Produto: {product}, Média de Interesse: {avg_interest}")
+            logger.debug(f"Produto: {product}, Média de Interesse: {avg_interest}", extra={'termo': product})
         else:
             trends_data.append([product, 0])
-            logger.warning(f"Sem dados para o produto: {product}")
+            logger.warning(f"Sem dados para o produto: {product}", extra={'termo': product})
+    return pd.DataFrame(trends_data, columns=["Produto", "Média de Interesse"])
+
+
+# Visão da categoria em uma execução do histórico, na ordem original dos produtos
+def category_view(category, run_at, products):
+    snapshot = historystore.history_store.snapshot(historystore.PRODUTOS_CATEGORIA, run_at)
+    scores = snapshot[snapshot["scope"] == category].set_index("term")["value"]
+    scores = scores.reindex(products).fillna(0).round().astype(int)
+    return pd.DataFrame({"Produto": products, "Média de Interesse": scores.values})
+
+
+# Função principal para coletar dados de tendências com base em uma categoria escolhida
+def fetch_trends_by_category(category, products, interest_data=None):
+    logger.info(f"Extraindo dados de tendências para a categoria: {category}")
+
+    # Coleta em lotes da última semana, a menos que os dados já tenham sido consultados
+    if interest_data is None:
+        interest_data = trendsplanner.fetch_interest(products, timeframe='now 7-d', geo='BR')
 
     # Criação do DataFrame e salvamento em TSV
-    df = pd.DataFrame(trends_data, columns=["Produto", "Média de Interesse"])
+    df = summarize_interest(products, interest_data)
     filename = f"{category.replace(' ', '_').lower()}.tsv"
-    df.to_csv(filename, sep='\t', index=False)
+    publisher.publish_frame(df, filename, key_columns=["Produto"])
     logger.info(f"Dados de tendências salvos em {filename}")
 
 
-def fetch_trends_by_category2(category, products, output_folder=config.TRENDING_PRODUCTS_FOLDER_IN):
-    os.makedirs(output_folder, exist_ok=True)
-    logger.info(f"Extraindo dados de tendências para a categoria: {category}")
-
-    # Configuração da API do Google Trends
-    pytrends = TrendReq(hl='pt-BR', tz=360)
-    timeframe = 'now 7-d'  # Última semana
+# Interesse do catálogo inteiro em uma escala comum: a última razão de cada produto em relação à âncora
+# (consultada agora ou mantida pela agenda) não depende dos outros termos da consulta, então todos os
+# produtos são normalizados juntos, com o maior do catálogo em 100, em uma única linha de médias
+def catalog_interest(products):
+    ratios = refresh_planner.last_values(historystore.PRODUTOS_CATEGORIA, products)
+    peak = max(ratios.values(), default=0)
+    if not peak:
+        return pd.DataFrame()
+    return pd.DataFrame([{product: ratio * 100 / peak for product, ratio in ratios.items()}])
 
-    # Coleta de dados de tendências para os produtos
-    trends_data = []
-    for product in products:
-        logger.info(f"Coletando dados para o produto: {product}")
-        pytrends.build_payload([product], timeframe=timeframe, geo='BR')
-        interest_data = pytrends.interest_over_time()
 
-        if not interest_data.empty:
-            avg_interest = round(interest_data[product].mean())
-            trends_data.append([product, avg_interest])
-            logger.info(f"Produto: {product}, Média de Interesse: {avg_interest}")
-        else:
-            trends_data.append([product, 0])
-            logger.warning(f"Sem dados para o produto: {product}")
+def fetch_trends_by_category2(category, products, output_folder=config.TRENDING_PRODUCTS_FOLDER_IN, interest_data=None):
+    os.makedirs(output_folder, exist_ok=True)
+    logger.info(f"Extraindo dados de tendências para a categoria: {category}")
 
-    # Salve o DataFrame no arquivo TSV
+    # Coleta em lotes da última semana, a menos que os dados já tenham sido consultados
+    if interest_data is None:
+        interest_data = trendsplanner.fetch_interest(products, timeframe='now 7-d', geo='BR')
 
+    # Grava a categoria no histórico e salva no arquivo TSV a visão da execução gravada
     filename = os.path.join(output_folder, f"{category.replace(' ', '_').lower()}.tsv")
-    df = pd.DataFrame(trends_data, columns=["Produto", "Média de Interesse"])
-    df.to_csv(filename, sep='\t', index=False)
+    df = summarize_interest(products, interest_data)
+    run_at = historystore.history_store.append(
+        historystore.PRODUTOS_CATEGORIA, df, "Produto", "Média de Interesse", scope=category)
+    df = category_view(category, run_at, products)
+    publisher.publish_frame(df, filename, key_columns=["Produto"])
     logger.info(f"Dados de tendências salvos em {filename}")
 
 
@@ -123,10 +129,32 @@ def execute_getproducts_trends():
         "mobiliario": mobiliario
     }
 
+    # Só os produtos vencidos na agenda são consultados, em uma única consulta em lotes para todas as categorias
+    todos_produtos = [produto for categoria in categorias for produto in produtos_por_categoria[categoria]]
+    escopo = historystore.PRODUTOS_CATEGORIA
+    atualizar = refresh_planner.select(escopo, todos_produtos, trendsplanner.MAX_TERMOS_POR_CONSULTA - 1)
+    if not atualizar:
+        logger.info("Nenhum produto com atualização prevista; arquivos mantidos.")
+        return
+
+    # Da reserva feita na seleção, só os lotes fora do cache gastam o orçamento
+    refresh_planner.settle(escopo, trendsplanner.uncached_batches(
+        trendsplanner.plan_batches(atualizar), timeframe='now 7-d', geo='BR'))
+    interest_data = trendsplanner.fetch_interest(atualizar, timeframe='now 7-d', geo='BR')
+    # Só entram na agenda os termos cujo lote voltou: uma falha ou bloqueio do Google não conta como termo
+    # estável, e os termos dos lotes que falharam continuam vencidos para a próxima execução
+    consultados = [produto for produto in atualizar if produto in interest_data.columns]
+    if len(consultados) < len(atualizar):
+        logger.warning(f"{len(atualizar) - len(consultados)} produtos sem resposta do Google Trends "
+                       f"continuam com atualização prevista.")
+    refresh_planner.record(escopo, trendsplanner.anchor_ratios(interest_data, consultados))
+
+    # Todas as categorias são republicadas a cada execução, recombinadas na escala comum do catálogo
+    catalogo = catalog_interest(todos_produtos)
     for categoria in categorias:
-        fetch_trends_by_category2(categoria, produtos_por_categoria[categoria])
-        time.sleep(90)
+        fetch_trends_by_category2(categoria, produtos_por_categoria[categoria], interest_data=catalogo)
 
 
 if __name__ == "__main__":
+    botlogging.configure_logging("getproductstrends")
     execute_getproducts_trends()
\ No newline at end of file
@@ -1,18 +1,200 @@
-from TikTokApi import TikTokApi
 import asyncio
+import csv
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
 
-ms_token = os.environ.get(
-    "ms_token", None
-)  # set your own ms_token, needs to have done a search before for this to work
+import pandas as pd
 
+import botlogging
+import config
+import metrics
+import publisher
+from jobdeadline import check_deadline, register_cleanup, unregister_cleanup
+
+logger = logging.getLogger(__name__)
+
+# Tokens ms_token separados por vírgula; cada um precisa ter feito uma busca antes para funcionar
+ms_tokens = [token for token in os.environ.get("ms_token", "").split(",") if token]
+
+TSV_HEADER = ["Origem", "Autor", "Descricao", "ID", "Visualizacoes", "Curtidas",
+              "Comentarios", "Compartilhamentos", "Data"]
+HASHTAGS_FILENAME = "tiktok_hashtags.tsv"
+CONTAS_FILENAME = "tiktok_contas.tsv"
+
+
+# Hashtags do topo do all_trends.tsv, no formato aceito pelo TikTok (sem # nem espaços)
+def trending_hashtags(limit=config.TIKTOK_HASHTAGS_TOP):
+    filename = os.path.join(config.WORD_TSV_FOLDER_IN, "all_trends.tsv")
+    if not os.path.exists(filename):
+        logger.warning(f"{filename} não encontrado; nenhuma hashtag em alta para buscar no TikTok.")
+        return []
+
+    termos = pd.read_csv(filename, sep='\t', usecols=["Hashtag"], dtype=str)["Hashtag"].dropna()
+    termos = termos.str.lstrip('#').str.replace(r'\s+', '', regex=True)
+    termos = termos[termos.str.fullmatch(r'\w+')]
+    return termos.drop_duplicates().head(limit).tolist()
+
+
+def load_saved_ids(filename):
+    if not os.path.exists(filename):
+        return set()
+    with open(filename, newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter='\t')
+        return {row["ID"] for row in reader if row.get("ID")}
+
+
+def video_row(origem, video):
+    data = video.as_dict
+    author = data.get('author') or {}
+    stats = data.get('stats') or {}
+    criado_em = data.get('createTime')
+    return [
+        origem,
+        author.get('uniqueId', 'desconhecido'),
+        (data.get('desc') or '').replace('\n', ' ').replace('\t', ' '),
+        str(data.get('id', video.id)),
+        stats.get('playCount', 0),
+        stats.get('diggCount', 0),
+        stats.get('commentCount', 0),
+        stats.get('shareCount', 0),
+        datetime.fromtimestamp(int(criado_em)).strftime("%d/%m/%Y %H:%M:%S") if criado_em else '',
+    ]
+
+
+class SessionPacer:
+    """
+    Reparte as sessões do TikTokApi entre as tarefas: cada alvo usa uma sessão por vez, e uma
+    sessão só volta a ser usada depois do intervalo mínimo desde sua última requisição.
+    """
+
+    def __init__(self, sessions, interval):
+        self.interval = interval
+        self._free = asyncio.Queue()
+        for index in range(sessions):
+            self._free.put_nowait(index)
+        self._last_used = [0.0] * sessions
+
+    @asynccontextmanager
+    async def session(self):
+        index = await self._free.get()
+        try:
+            wait = self._last_used[index] + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield index
+        finally:
+            self._last_used[index] = time.monotonic()
+            self._free.put_nowait(index)
+
+
+class TsvStream:
+    """ Acumula as linhas novas de um TSV e grava em blocos à medida que os vídeos chegam. """
+
+    def __init__(self, filename, flush_rows):
+        self.filename = filename
+        self.flush_rows = flush_rows
+        self.saved_ids = load_saved_ids(filename)
+        self.written = 0
+        self._buffer = []
+
+    async def add(self, row):
+        if row[3] in self.saved_ids:
+            return
+        self.saved_ids.add(row[3])
+        self._buffer.append(row)
+        if len(self._buffer) >= self.flush_rows:
+            await self.flush()
+
+    async def flush(self):
+        rows, self._buffer = self._buffer, []
+        if rows:
+            # A gravação (com fsync) sai do loop de eventos para não travar as outras sessões
+            await asyncio.to_thread(publisher.append_rows, TSV_HEADER, rows, self.filename, ["ID"])
+            self.written += len(rows)
+
+
+async def collect_target(api, pacer, stream, kind, name, count):
+    async with pacer.session() as session_index:
+        started = time.perf_counter()
+        total = 0
+        try:
+            if kind == 'hashtag':
+                videos = api.hashtag(name=name).videos(count=count, session_index=session_index)
+            else:
+                videos = api.user(username=name).videos(count=count, session_index=session_index)
+            async for video in videos:
+                await stream.add(video_row(f"{kind}:{name}", video))
+                total += 1
+            metrics.record_request('tiktok', kind, 'ok', time.perf_counter() - started)
+            logger.info(f"TikTok {kind} {name}: {total} vídeos (sessão {session_index}).")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.record_request('tiktok', kind, 'error', time.perf_counter() - started)
+            logger.error(f"Erro ao buscar vídeos do TikTok para {kind} {name}: {e}")
+
+
+async def collect_videos(hashtags, accounts, sessions=config.TIKTOK_SESSOES,
+                         videos_per_target=config.TIKTOK_VIDEOS_POR_ALVO):
+    output_folder = config.TIKTOK_TSV_FOLDER_IN
+    os.makedirs(output_folder, exist_ok=True)
+    streams = {
+        'hashtag': TsvStream(os.path.join(output_folder, HASHTAGS_FILENAME), config.TIKTOK_LINHAS_POR_GRAVACAO),
+        'conta': TsvStream(os.path.join(output_folder, CONTAS_FILENAME), config.TIKTOK_LINHAS_POR_GRAVACAO),
+    }
+    targets = [('hashtag', name) for name in hashtags] + [('conta', name) for name in accounts]
+    if not targets:
+        logger.warning("Nenhuma hashtag ou conta para buscar no TikTok.")
+        return
+
+    # O TikTokApi (e o Playwright) só é carregado quando a coleta roda
+    from TikTokApi import TikTokApi
 
-async def search_users():
     async with TikTokApi() as api:
-        await api.create_sessions(ms_tokens=[ms_token], num_sessions=1, sleep_after=3)
-        async for user in api.search.users("david teather", count=10):
-            print(user)
+        await api.create_sessions(ms_tokens=ms_tokens or None, num_sessions=sessions, sleep_after=3,
+                                  headless=True)
+        pacer = SessionPacer(sessions, config.TIKTOK_INTERVALO_SESSAO)
+        try:
+            await asyncio.gather(*(collect_target(api, pacer, streams[kind], kind, name, videos_per_target)
+                                   for kind, name in targets))
+        finally:
+            for stream in streams.values():
+                await stream.flush()
+
+    for stream in streams.values():
+        logger.info(f"{stream.written} vídeos novos gravados em {stream.filename}.")
+
+
+# Roda a coleta e permite que o prazo do job (vindo de outra thread) cancele a tarefa principal
+async def _run_cancellable(coroutine):
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+
+    def cancel():
+        loop.call_soon_threadsafe(task.cancel)
+
+    register_cleanup(cancel)
+    try:
+        return await coroutine
+    finally:
+        unregister_cleanup(cancel)
+
+
+# Ponto de entrada síncrono: o loop asyncio roda na thread do job, fora da thread do agendador
+def execute_get_tiktok_videos(hashtags=None, accounts=None):
+    hashtags = trending_hashtags() if hashtags is None else hashtags
+    accounts = config.TIKTOK_CONTAS if accounts is None else accounts
+    logger.info(f"Buscando vídeos do TikTok para {len(hashtags)} hashtags e {len(accounts)} contas.")
+    try:
+        asyncio.run(_run_cancellable(collect_videos(hashtags, accounts)))
+    except asyncio.CancelledError:
+        check_deadline()
+        raise
 
 
 if __name__ == "__main__":
-    asyncio.run(search_users())
\ No newline at end of file
+    botlogging.configure_logging("gettiktokvideos")
+    execute_get_tiktok_videos()
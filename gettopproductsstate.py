@@ -1,19 +1,19 @@
+import csv
+import json
 import pandas as pd
-from pytrends.request import TrendReq
 import logging
-import time
 import os
 from datetime import datetime
 
+import botlogging
 import config
+import historystore
+import publisher
+import trendsplanner
+from refreshplanner import refresh_planner
 
-# Configuração do logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configuração do pytrends
-pytrends = TrendReq(hl='pt-BR', tz=360)
-
 # Lista de estados do Brasil
 estados = ["AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA",
            "MT", "MS", "MG", "PA", "PB", "PR", "PE", "PI", "RJ", "RN",
@@ -37,25 +37,122 @@ produtos_populares = [
     "Mesa de Centro", "Cadeira Gamer", "Banqueta Alta"
 ]
 
-# Caminho do arquivo de progresso
-arquivo_progresso = "progresso_tendencias.txt"
+# Diário (append-only) com o resultado bruto de cada lote já consultado, para retomar sem repetir consultas
+arquivo_diario = os.path.join(config.STATE_FOLDER, "gettopproductsstate_diario.tsv")
+# Matriz produto x estado da última varredura completa, gerada ao compactar o diário
+arquivo_matriz = os.path.join(config.STATE_FOLDER, "matriz_produto_estado.tsv")
+# Produtos escolhidos pela agenda para a varredura em andamento; fixos até a compactação, para o diário valer na retomada
+arquivo_selecao = os.path.join(config.STATE_FOLDER, "gettopproductsstate_selecao.json")
 output_folder = config.MAP_TSV_FOLDER_IN
-os.makedirs(output_folder, exist_ok=True)
 arquivo_resultados = os.path.join(output_folder, "item_mais_procurado_por_regiao.tsv")
 
-# Função para salvar progresso
-def salvar_progresso(estado_atual, resultados_parciais):
-    with open(arquivo_progresso, "w") as f:
-        f.write(estado_atual)
-    resultados_parciais.to_csv("resultados_parciais.tsv", sep='\t', index=False)
-    logger.info(f"Progresso salvo: {estado_atual}")
+# Linha que fecha cada lote no diário; lotes sem ela (gravação interrompida) são ignorados
+MARCADOR_LOTE = "*"
+
+# Função para registrar no diário as células (estado, produto, pontuação) de um lote consultado
+def registrar_lote(diario, indice, lote, dados):
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    writer = csv.writer(diario, delimiter='\t')
+    for estado, linha in dados.iterrows():
+        for termo in lote:
+            if termo in linha.index:
+                writer.writerow([indice, estado, termo, linha[termo], timestamp])
+    writer.writerow([indice, MARCADOR_LOTE, '|'.join(lote), '', timestamp])
+    # Um fsync por lote: cada consulta feita fica gravada antes da próxima começar
+    diario.flush()
+    os.fsync(diario.fileno())
+
+# Função para descartar a última linha do diário quando ela foi cortada por uma queda do processo,
+# para que o próximo registro não seja gravado colado nela
+def reparar_diario():
+    if not os.path.exists(arquivo_diario):
+        return
+    with open(arquivo_diario, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        tamanho = f.tell()
+        if not tamanho:
+            return
+        f.seek(tamanho - 1)
+        if f.read(1) == b'\n':
+            return
+        f.seek(0)
+        conteudo = f.read()
+        f.truncate(conteudo.rfind(b'\n') + 1)
+    logger.warning("Última linha do diário estava incompleta e foi descartada.")
+
+# Função para carregar os lotes completos do diário. Só valem as células gravadas entre um marcador
+# e o anterior do mesmo lote: células de uma gravação interrompida (sem marcador) são ignoradas, e
+# um lote consultado de novo substitui o anterior
+def carregar_diario():
+    if not os.path.exists(arquivo_diario):
+        return {}
+
+    celulas = {}
+    lotes_completos = {}
+    with open(arquivo_diario, newline='', encoding='utf-8') as f:
+        for linha in csv.reader(f, delimiter='\t'):
+            if len(linha) != 5:
+                continue  # Última linha cortada por uma queda do processo
+            indice, estado, termo, valor, _ = linha
+            indice = int(indice)
+            if estado == MARCADOR_LOTE:
+                lotes_completos[indice] = (termo.split('|'), celulas.pop(indice, []))
+            else:
+                celulas.setdefault(indice, []).append((estado, termo, float(valor)))
+
+    lotes_consultados = {}
+    for indice, (lote, celulas_lote) in lotes_completos.items():
+        dados = pd.DataFrame(celulas_lote, columns=["Estado", "Termo", "Valor"])
+        dados = dados.drop_duplicates(subset=["Estado", "Termo"], keep="last")
+        lotes_consultados[indice] = (
+            dados.pivot(index="Estado", columns="Termo", values="Valor").reindex(columns=lote)
+            if not dados.empty else pd.DataFrame(columns=lote)
+        )
+    return lotes_consultados
+
+# Função para compactar o diário ao fim de uma varredura completa: guarda só a matriz final
+def compactar_diario(matriz):
+    os.makedirs(config.STATE_FOLDER, exist_ok=True)
+    matriz.to_csv(arquivo_matriz, sep='\t', index_label="Estado")
+    for arquivo in (arquivo_diario, arquivo_selecao):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+    logger.info(f"Diário compactado em {arquivo_matriz}.")
+
+# Função para escolher os produtos da varredura: os vencidos na agenda, ou os da varredura interrompida
+def selecionar_produtos():
+    if os.path.exists(arquivo_selecao):
+        with open(arquivo_selecao, encoding='utf-8') as f:
+            produtos = json.load(f)
+        logger.info(f"Retomando a seleção de {len(produtos)} produtos da varredura anterior.")
+        return produtos
 
-# Função para carregar progresso
-def carregar_progresso():
-    if os.path.exists(arquivo_progresso):
-        with open(arquivo_progresso, "r") as f:
-            return f.read().strip()
-    return None
+    produtos = refresh_planner.select(historystore.PRODUTOS_ESTADO, produtos_populares,
+                                      trendsplanner.MAX_TERMOS_POR_CONSULTA - 1)
+    if produtos:
+        os.makedirs(config.STATE_FOLDER, exist_ok=True)
+        with open(arquivo_selecao, 'w', encoding='utf-8') as f:
+            json.dump(produtos, f, ensure_ascii=False)
+    return produtos
+
+# Função para completar a matriz com os produtos que ficaram fora da varredura, a partir da matriz anterior.
+# Cada estado é reescalado pela âncora: pontuação anterior / âncora anterior * âncora atual
+def completar_com_matriz_anterior(matriz):
+    if not os.path.exists(arquivo_matriz):
+        return matriz
+    anterior = pd.read_csv(arquivo_matriz, sep='\t', index_col="Estado").reindex(matriz.index)
+    ancora = config.GOOGLE_TRENDS_ANCHOR
+    faltantes = [produto for produto in produtos_populares
+                 if produto in anterior.columns and produto not in matriz.columns]
+    if not faltantes:
+        return matriz
+
+    mantidos = anterior[faltantes]
+    if ancora in anterior.columns and ancora in matriz.columns:
+        fator = (matriz[ancora] / anterior[ancora]).replace([float('inf'), -float('inf')], float('nan'))
+        mantidos = mantidos.mul(fator, axis=0).fillna(anterior[faltantes])
+    logger.info(f"{len(faltantes)} produtos mantidos da varredura anterior.")
+    return pd.concat([matriz, mantidos], axis=1)
 
 # Função para carregar resultados existentes
 def carregar_resultados_existentes():
@@ -63,83 +160,135 @@ def carregar_resultados_existentes():
         return pd.read_csv(arquivo_resultados, sep='\t')
     return pd.DataFrame(columns=["Estado", "Item", "LastUpdate"])
 
-# Função para obter o item mais procurado por estado
-def obter_item_mais_procurado_por_estado():
-    resultados = carregar_resultados_existentes()
+# Função para montar a matriz produto x estado varrendo o país em lotes de produtos.
+# Devolve também os produtos consultados nesta execução e se todos os lotes da varredura deram certo
+def montar_matriz_produto_estado(produtos=produtos_populares):
+    lotes = trendsplanner.plan_batches(produtos)
+    reparar_diario()
+    lotes_consultados = carregar_diario()
 
-    # Carregar progresso anterior
-    ultimo_estado = carregar_progresso()
-    if ultimo_estado:
-        logger.info(f"Retomando a partir do estado: {ultimo_estado}")
-        estados_restantes = estados[estados.index(ultimo_estado):]
+    # Descarta lotes do diário que não correspondem mais à lista atual de produtos
+    lotes_consultados = {
+        indice: lote for indice, lote in lotes_consultados.items()
+        if indice < len(lotes) and list(lote.columns) == lotes[indice]
+    }
+    if lotes_consultados:
+        logger.info(f"Retomando a varredura com {len(lotes_consultados)} de {len(lotes)} lotes já consultados.")
     else:
-        estados_restantes = estados
-        logger.info("Iniciando a execução do zero.")
+        logger.info("Iniciando a varredura nacional do zero.")
 
-    for estado in estados_restantes:
-        logger.info(f"Consultando tendências para o estado: {estado}")
+    # Da reserva feita na seleção, só os lotes pendentes fora do cache gastam o orçamento
+    pendentes = [indice for indice in range(len(lotes)) if indice not in lotes_consultados]
+    refresh_planner.settle(historystore.PRODUTOS_ESTADO, trendsplanner.uncached_batches(
+        [lotes[indice] for indice in pendentes], trendsplanner.INTEREST_BY_REGION,
+        timeframe='now 7-d', geo='BR', resolution='REGION'))
 
-        maior_pontuacao = 0
-        item_mais_procurado = None
+    atualizados = []
+    os.makedirs(config.STATE_FOLDER, exist_ok=True)
+    with open(arquivo_diario, 'a', newline='', encoding='utf-8') as diario:
+        # O ritmo das consultas é controlado pelo limitador compartilhado do Google Trends
+        logger.info(f"Consultando {len(pendentes)} lotes pendentes de {len(lotes)}.")
+        # Cada lote é gravado no diário assim que fica pronto (em sequência ou pelos workers da fila)
+        for posicao, dados in trendsplanner.fetch_batches(
+                [lotes[indice] for indice in pendentes], trendsplanner.INTEREST_BY_REGION,
+                timeframe='now 7-d', geo='BR', resolution='REGION'):
+            indice = pendentes[posicao]
+            lotes_consultados[indice] = dados
+            registrar_lote(diario, indice, lotes[indice], dados)
+            atualizados.extend(produto for produto in lotes[indice] if produto != config.GOOGLE_TRENDS_ANCHOR)
+            logger.info(f"Lote {indice + 1}/{len(lotes)} consultado: {', '.join(lotes[indice])}")
 
-        for produto in produtos_populares:
-            try:
-                # Construir o payload para o estado e produto
-                pytrends.build_payload([produto], timeframe='now 7-d', geo=f'BR-{estado}')
-                interesse_regiao = pytrends.interest_by_region(resolution='REGION')
+    completa = len(lotes_consultados) == len(lotes)
+    if not completa:
+        logger.warning(f"{len(lotes) - len(lotes_consultados)} de {len(lotes)} lotes falharam; "
+                       f"a próxima execução retoma a varredura.")
 
-                if not interesse_regiao.empty and estado in interesse_regiao.index:
-                    pontuacao = interesse_regiao.loc[estado, produto]
+    matriz = trendsplanner.combine_batches(
+        [lotes_consultados[indice] for indice in sorted(lotes_consultados)],
+        endpoint=trendsplanner.INTEREST_BY_REGION)
+    if matriz.empty:
+        return matriz, atualizados, completa
 
-                    # Atualizar o item mais procurado se encontrar uma pontuação maior
-                    if pontuacao > maior_pontuacao:
-                        maior_pontuacao = pontuacao
-                        item_mais_procurado = produto
+    # Converte o código "BR-SP" na sigla do estado usada no restante do módulo
+    matriz.index = matriz.index.str.replace('BR-', '', regex=False)
+    matriz = completar_com_matriz_anterior(matriz.reindex(index=estados))
+    # A âncora fica na matriz para reescalar os produtos mantidos na próxima varredura
+    colunas = [produto for produto in produtos_populares if produto in matriz.columns]
+    if config.GOOGLE_TRENDS_ANCHOR in matriz.columns:
+        colunas.append(config.GOOGLE_TRENDS_ANCHOR)
+    return matriz.reindex(columns=colunas).fillna(0), atualizados, completa
 
-            except Exception as e:
-                logger.error(f"Erro ao consultar produto {produto} no estado {estado}: {e}")
-                continue
+# Grava a matriz no histórico; estados sem nenhuma pontuação ficam de fora da execução
+def registrar_historico(matriz):
+    pontuacoes = matriz.reindex(columns=produtos_populares).fillna(0)
+    pontuacoes = pontuacoes[pontuacoes.max(axis=1) > 0]
+    celulas = pontuacoes.rename_axis(index="Estado", columns="Produto").stack().rename("Valor").reset_index()
+    return historystore.history_store.append(
+        historystore.PRODUTOS_ESTADO, celulas, "Produto", "Valor", scope_column="Estado")
 
-        if item_mais_procurado:
-            logger.info(f"Estado: {estado} | Item mais procurado: {item_mais_procurado}")
-            timestamp_atual = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+# Função para obter o item mais procurado por estado
+# Visão do item mais procurado a partir da última execução de cada estado no histórico
+def obter_item_mais_procurado_por_estado():
+    resultados = carregar_resultados_existentes()
+    ultimas = historystore.history_store.latest(historystore.PRODUTOS_ESTADO)
+    if ultimas.empty:
+        return resultados
 
-            # Atualizar ou adicionar resultado no DataFrame
-            if estado in resultados["Estado"].values:
-                resultados.loc[resultados["Estado"] == estado, ["Item", "LastUpdate"]] = [item_mais_procurado, timestamp_atual]
-            else:
-                resultados = pd.concat([resultados, pd.DataFrame([{
-                    "Estado": estado,
-                    "Item": item_mais_procurado,
-                    "LastUpdate": timestamp_atual
-                }])], ignore_index=True)
+    matriz = ultimas.pivot(index="scope", columns="term", values="value").reindex(columns=produtos_populares)
+    itens_mais_procurados = matriz.idxmax(axis=1)
+    atualizacoes = ultimas.groupby("scope")["run_at"].max().dt.strftime("%d/%m/%Y %H:%M:%S")
 
-        # Adicionar um pequeno delay entre consultas para evitar bloqueios
-        time.sleep(60)
+    for estado in estados:
+        if estado not in itens_mais_procurados.index:
+            continue
 
-        # Salvar progresso e resultados parciais
-        salvar_progresso(estado, resultados)
+        item_mais_procurado = itens_mais_procurados[estado]
+        logger.debug(f"Estado: {estado} | Item mais procurado: {item_mais_procurado}",
+                     extra={'estado': estado, 'termo': item_mais_procurado})
 
+        # Atualizar ou adicionar resultado no DataFrame
+        if estado in resultados["Estado"].values:
+            resultados.loc[resultados["Estado"] == estado, ["Item", "LastUpdate"]] = [item_mais_procurado, atualizacoes[estado]]
+        else:
+            resultados = pd.concat([resultados, pd.DataFrame([{
+                "Estado": estado,
+                "Item": item_mais_procurado,
+                "LastUpdate": atualizacoes[estado]
+            }])], ignore_index=True)
+
+    logger.info(f"Item mais procurado atualizado para {len(itens_mais_procurados)} estados.")
     return resultados
 
 def execute_getproductsstate():
     logger.info("Iniciando coleta de dados...")
+    produtos = selecionar_produtos()
+    if not produtos:
+        logger.info("Nenhum produto com atualização prevista; mapa mantido.")
+        return
+
+    matriz, atualizados, completa = montar_matriz_produto_estado(produtos)
+    if not matriz.columns.empty:
+        # Só os produtos consultados agora entram na agenda; os mantidos da matriz anterior não são observações
+        # novas, e os de lotes que falharam continuam na seleção para a retomada
+        refresh_planner.record(historystore.PRODUTOS_ESTADO, trendsplanner.anchor_ratios(matriz, atualizados))
+        registrar_historico(matriz)
     dados = obter_item_mais_procurado_por_estado()
 
     if not dados.empty:
         # Salvar o resultado final no arquivo
-        dados.to_csv(arquivo_resultados, sep='\t', index=False)
-        logger.info(f"Arquivo atualizado: {arquivo_resultados}")
-
-        # Remover arquivos de progresso após a conclusão
-        if os.path.exists(arquivo_progresso):
-            os.remove(arquivo_progresso)
-        if os.path.exists("resultados_parciais.tsv"):
-            os.remove("resultados_parciais.tsv")
-    else:
+        publisher.publish_frame(dados, arquivo_resultados, key_columns=["Estado"])
+
+    if matriz.empty:
+        # Nenhum lote desta varredura deu certo: a matriz anterior, o diário e a seleção ficam para a retomada
         logger.warning("Nenhum dado coletado.")
+    elif not completa:
+        logger.warning("Varredura incompleta; diário e seleção mantidos até todos os lotes darem certo.")
+    else:
+        # O diário só é compactado depois que o resultado final foi gravado
+        compactar_diario(matriz)
 
 
 # Função principal
 if __name__ == "__main__":
+    botlogging.configure_logging("gettopproductsstate")
     execute_getproductsstate()
@@ -1,84 +1,350 @@
 import os
 import requests
 import csv
+import hashlib
+import json
 import argparse
 import logging
+import threading
+import time
+import botlogging
 import config
+import httpsession
+import jobdeadline
+import metrics
+import publisher
+import tweetdedup
+from urllib.parse import urlparse
 
-# Configuração do logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Configuração do token de autenticação
 bearer_token = os.environ.get("TWITTER_BEARER_TOKEN")
-if not bearer_token:
-    logger.error("BEARER_TOKEN não encontrado. Configure-o como uma variável de ambiente.")
 
-search_url = "https://api.twitter.com/2/tweets/search/recent"
+search_url = f"{config.TWITTER_API_BASE_URL}/2/tweets/search/recent"
+
+# Colunas dos arquivos de tweets; o ID permite acrescentar sem duplicar
+TSV_HEADER = ["Autor", "Texto", "ID"]
 
 
 def bearer_oauth(r):
     """
     Função de autenticação Bearer.
     """
+    if not bearer_token:
+        logger.error("BEARER_TOKEN não encontrado. Configure-o como uma variável de ambiente.")
     r.headers["Authorization"] = f"Bearer {bearer_token}"
     r.headers["User-Agent"] = "v2RecentSearchPython"
     return r
 
 
+class RateLimitBudget:
+    """
+    Acompanha os cabeçalhos x-rate-limit-* de cada endpoint para espaçar as próximas
+    chamadas antes que o limite acabe.
+    """
+
+    def __init__(self, reserve):
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._limits = {}
+
+    def update(self, url, headers):
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self._limits[url] = (int(remaining), float(reset))
+
+    # Segundos até o reset da janela do endpoint
+    def seconds_until_reset(self, url):
+        with self._lock:
+            _, reset = self._limits.get(url, (None, time.time()))
+        return max(0.0, reset - time.time())
+
+    # Quando restam poucas chamadas, distribui as que sobram até o reset da janela
+    def delay_for(self, url):
+        with self._lock:
+            if url not in self._limits:
+                return 0.0
+            remaining, reset = self._limits[url]
+        until_reset = reset - time.time()
+        if until_reset <= 0 or remaining > self.reserve:
+            return 0.0
+        if remaining <= 0:
+            return until_reset + 1
+        return until_reset / remaining
+
+    def stats(self):
+        with self._lock:
+            return {url: {'remaining': remaining, 'reset': reset}
+                    for url, (remaining, reset) in self._limits.items()}
+
+
+# Sessão keep-alive compartilhada por todas as chamadas à API v2
+session = httpsession.create_session(pool_size=4)
+rate_limit_budget = RateLimitBudget(config.TWITTER_RESERVA_REQUISICOES)
+metrics.register_gauge_callback(lambda: [
+    ('cb_twitter_rate_limit_remaining', {'endpoint': urlparse(url).path}, limit['remaining'])
+    for url, limit in rate_limit_budget.stats().items()
+])
+
+
 def connect_to_endpoint(url, params):
-    response = requests.get(url, auth=bearer_oauth, params=params)
-    logger.info(f"Requisição para URL: {response.url}")
-    if response.status_code != 200:
+    for attempt in range(1, config.TWITTER_TENTATIVAS + 1):
+        delay = rate_limit_budget.delay_for(url)
+        if delay > 0:
+            logger.info(f"Poucas requisições restantes para {url}; aguardando {delay:.1f}s.")
+            jobdeadline.sleep(delay)
+
+        endpoint = urlparse(url).path
+        started = time.perf_counter()
+        try:
+            response = session.get(url, auth=bearer_oauth, params=params, timeout=30)
+        except requests.RequestException as e:
+            metrics.record_request('twitter', endpoint, 'error', time.perf_counter() - started)
+            metrics.inc('cb_http_retries_total', {'service': 'twitter', 'reason': 'connection'})
+            backoff = min(2 ** attempt, 60)
+            logger.warning(f"Falha de conexão ({e}); nova tentativa em {backoff}s.")
+            jobdeadline.sleep(backoff)
+            continue
+
+        metrics.record_request('twitter', endpoint, response.status_code, time.perf_counter() - started)
+        rate_limit_budget.update(url, response.headers)
+        logger.info(f"Requisição para URL: {response.url}")
+        if response.status_code == 200:
+            return response.json()
+
+        if response.status_code == 429:
+            # Espera exatamente até a janela de limite ser renovada
+            wait = rate_limit_budget.seconds_until_reset(url) + 1
+            logger.warning(f"Limite de requisições atingido; aguardando {wait:.0f}s até o reset.")
+            metrics.inc('cb_http_retries_total', {'service': 'twitter', 'reason': '429'})
+            jobdeadline.sleep(wait)
+            continue
+
+        if response.status_code >= 500:
+            backoff = min(2 ** attempt, 60)
+            logger.warning(f"Erro temporário {response.status_code}; nova tentativa em {backoff}s.")
+            metrics.inc('cb_http_retries_total', {'service': 'twitter', 'reason': str(response.status_code)})
+            jobdeadline.sleep(backoff)
+            continue
+
         logger.error(f"Erro na requisição: {response.status_code} - {response.text}")
         return None
-    return response.json()
 
+    logger.error(f"Requisição para {url} falhou após {config.TWITTER_TENTATIVAS} tentativas.")
+    return None
 
-def fetch_mentions(username, max_results):
-    max_results = max(10, min(max_results, 100))
-    query = f"@{username} -is:retweet"
+
+# Funções para montar as consultas; o texto da consulta também identifica o cursor salvo
+def mentions_query(username):
+    return f"@{username} -is:retweet"
+
+
+def hashtags_query(hashtags):
+    return " OR ".join(f"#{hashtag}" for hashtag in hashtags) + " -is:retweet"
+
+
+def load_cursors():
+    if os.path.exists(config.TWITTER_CURSORS_FILE):
+        with open(config.TWITTER_CURSORS_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+# Salva o tweet mais recente já gravado para a consulta, usado como since_id na próxima execução
+def update_cursor(query, tweets):
+    if not tweets:
+        return
+    advance_cursor(query, max(int(tweet['id']) for tweet in tweets))
+
+
+def advance_cursor(query, newest_id):
+    cursors = load_cursors()
+    if not newest_id or int(newest_id) <= int(cursors.get(query, 0)):
+        return
+    cursors[query] = str(newest_id)
+    os.makedirs(os.path.dirname(config.TWITTER_CURSORS_FILE), exist_ok=True)
+    with open(config.TWITTER_CURSORS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(cursors, f, indent=2)
+    logger.info(f"Cursor atualizado para '{query}': {newest_id}")
+
+
+# Parâmetros da busca recente: só tweets mais novos que o cursor salvo
+def search_params(query, max_results):
     query_params = {
         'query': query,
         'tweet.fields': 'created_at,author_id,text',
         'expansions': 'author_id',  # Expande para incluir dados do autor
         'user.fields': 'username',  # Inclui o campo username no retorno
-        'max_results': max_results
+        'max_results': max(10, min(max_results, 100))
     }
-    logger.info(f"Buscando menções para @{username}...")
-    response_json = connect_to_endpoint(search_url, query_params)
+    since_id = load_cursors().get(query)
+    if since_id:
+        query_params['since_id'] = since_id
+    return query_params
+
+
+# Etapa do pipeline: páginas da busca recente, seguindo o next_token (a partir do que estiver em params)
+def iter_pages(query_params, max_pages=None):
+    params = dict(query_params)
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        response_json = connect_to_endpoint(search_url, params)
+        if not response_json:
+            return
+        pages += 1
+        yield response_json
+
+        next_token = response_json.get("meta", {}).get("next_token")
+        if not next_token:
+            return
+        params['next_token'] = next_token
+
+
+# Etapa do pipeline: devolve cada página com seus tweets, já com o username do autor
+def expand_authors(pages):
+    for page in pages:
+        # Mapeia os author_id para usernames
+        users = {user["id"]: user["username"] for user in page.get("includes", {}).get("users", [])}
+        tweets = page.get("data", [])
+
+        # Substitui author_id pelo username no resultado
+        for tweet in tweets:
+            tweet['author_username'] = f"@{users.get(tweet['author_id'], 'desconhecido')}"
+        yield page, tweets
+
+
+# Busca paginada: só tweets mais novos que o cursor salvo, seguindo o next_token até o fim.
+# Uma busca interrompida (limite de páginas ou falha na requisição) continua da mesma página na
+# próxima execução; o cursor só avança quando a última página chega (ver finish_search).
+# Com resume=False a busca sempre começa do cursor, sem retomar páginas antigas
+def search_recent(query, max_results, max_pages=config.TWITTER_MAX_PAGINAS, resume=True):
+    filename = checkpoint_file(query, config.TWITTER_PAGINACAO_FOLDER)
+    if resume and os.path.exists(filename):
+        with open(filename, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        logger.info(f"Retomando a busca de '{query}' da página em que parou.")
+    else:
+        checkpoint = {'query': query, 'params': search_params(query, max_results), 'newest_id': None,
+                      'complete': False}
+
+    tweets = []
+    for page, page_tweets in expand_authors(iter_pages(checkpoint['params'], max_pages)):
+        tweets.extend(page_tweets)
+        meta = page.get("meta", {})
+        if meta.get("newest_id") and int(meta["newest_id"]) > int(checkpoint['newest_id'] or 0):
+            checkpoint['newest_id'] = meta["newest_id"]
+        if not meta.get("next_token"):
+            checkpoint['complete'] = True
+            break
+        checkpoint['params']['next_token'] = meta["next_token"]
+    if resume and not checkpoint['complete']:
+        logger.warning(f"Busca de '{query}' parou antes da última página (limite de {max_pages} páginas ou falha); "
+                       f"a próxima execução continua do mesmo ponto.")
 
-    # Mapeia os author_id para usernames
-    users = {user["id"]: user["username"] for user in response_json.get("includes", {}).get("users", [])}
-    tweets = response_json.get("data", []) if response_json else []
+    logger.info(f"{len(tweets)} tweets novos para '{query}'.")
+    return tweets, checkpoint
 
-    # Substitui author_id pelo username no resultado
-    for tweet in tweets:
-        tweet['author_username'] = f"@{users.get(tweet['author_id'], 'desconhecido')}"
-    return tweets
+
+# Chamada depois que os tweets da busca foram gravados: com a busca completa o cursor avança;
+# interrompida, o checkpoint fica salvo e o cursor não passa por cima dos tweets que faltam
+def finish_search(query, checkpoint):
+    filename = checkpoint_file(query, config.TWITTER_PAGINACAO_FOLDER)
+    if not checkpoint['complete']:
+        save_checkpoint(filename, checkpoint)
+        return
+    advance_cursor(query, checkpoint['newest_id'])
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def checkpoint_file(query, folder=config.TWITTER_BACKFILL_FOLDER):
+    digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(folder, f"{digest}.json")
+
+
+def save_checkpoint(filename, checkpoint):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp_path = f"{filename}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, filename)
+
+
+# Backfill em streaming: cada página é gravada assim que chega e só então o checkpoint avança,
+# então a memória não cresce com o volume e uma execução interrompida continua da última página
+def backfill(query, filename, max_results=100, max_pages=None, start_time=None):
+    checkpoint_path = checkpoint_file(query)
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        logger.info(f"Retomando backfill de '{query}' após {checkpoint['pages']} páginas "
+                    f"({checkpoint['tweets']} tweets).")
+    else:
+        params = search_params(query, max_results)
+        if start_time:
+            params['start_time'] = start_time
+        checkpoint = {'query': query, 'params': params, 'pages': 0, 'tweets': 0, 'newest_id': None}
+
+    complete = False
+    for page, tweets in expand_authors(iter_pages(checkpoint['params'], max_pages)):
+        save_to_tsv(tweets, filename)
+
+        meta = page.get("meta", {})
+        if meta.get("newest_id") and int(meta["newest_id"]) > int(checkpoint['newest_id'] or 0):
+            checkpoint['newest_id'] = meta["newest_id"]
+        checkpoint['pages'] += 1
+        checkpoint['tweets'] += len(tweets)
+        if not meta.get("next_token"):
+            complete = True
+            break
+        checkpoint['params']['next_token'] = meta["next_token"]
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    if not complete:
+        save_checkpoint(checkpoint_path, checkpoint)
+        logger.warning(f"Backfill de '{query}' parou após {checkpoint['pages']} páginas; "
+                       f"a próxima execução continua do mesmo ponto.")
+        return checkpoint
+
+    # Só ao fim da janela o cursor da coleta periódica avança, para não pular a lacuna
+    advance_cursor(query, checkpoint['newest_id'])
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    logger.info(f"Backfill de '{query}' concluído: {checkpoint['tweets']} tweets em {checkpoint['pages']} páginas.")
+    return checkpoint
+
+
+def fetch_mentions(username, max_results):
+    logger.info(f"Buscando menções para @{username}...")
+    return search_recent(mentions_query(username), max_results)
 
 
 def fetch_tweets_by_hashtags(hashtags, max_results):
-    max_results = max(10, min(max_results, 100))
-    query = " OR ".join(f"#{hashtag}" for hashtag in hashtags) + " -is:retweet"
-    query_params = {
-        'query': query,
-        'tweet.fields': 'created_at,author_id,text',
-        'expansions': 'author_id',
-        'user.fields': 'username',
-        'max_results': max_results
-    }
     logger.info(f"Buscando tweets com hashtags: {', '.join(hashtags)}")
-    response_json = connect_to_endpoint(search_url, query_params)
+    return search_recent(hashtags_query(hashtags), max_results)
+
+
+# Lê os IDs já gravados no arquivo; arquivos no formato antigo (sem coluna ID) são convertidos
+def load_saved_ids(filename):
+    if not os.path.exists(filename):
+        return set()
 
-    # Mapeia os author_id para usernames
-    users = {user["id"]: user["username"] for user in response_json.get("includes", {}).get("users", [])}
-    tweets = response_json.get("data", []) if response_json else []
+    with open(filename, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file, delimiter='\t'))
+    if not rows:
+        return set()
 
-    # Substitui author_id pelo username no resultado
-    for tweet in tweets:
-        tweet['author_username'] = f"@{users.get(tweet['author_id'], 'desconhecido')}"
-    return tweets
+    header, data = rows[0], rows[1:]
+    if "ID" in header:
+        id_index = header.index("ID")
+        return {row[id_index] for row in data if len(row) > id_index and row[id_index]}
+
+    publisher.publish_rows(TSV_HEADER, [row[:2] + [''] for row in data], filename)
+    return set()
 
 
 def save_to_tsv(tweets, filename):
@@ -86,38 +352,75 @@ def save_to_tsv(tweets, filename):
         logger.info(f"Nenhum dado para salvar em {filename}")
         return
 
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter='\t')
-        writer.writerow(["Autor", "Texto"])  # Modificado para "Autor" (username)
-        for tweet in tweets:
-            cleaned_text = tweet['text'].replace('\n', ' ').replace('\t', ' ')
-            writer.writerow(
-                [tweet.get('author_username', 'desconhecido'), cleaned_text])  # Usa o username
-    logger.info(f"Resultados salvos em {filename}")
+    # Acrescenta ao arquivo apenas os tweets que ainda não foram gravados, do mais antigo para o mais novo
+    dedup_index = tweetdedup.get_index(filename, seed=lambda: load_saved_ids(filename))
+    new_tweets = dedup_index.filter_new(reversed(tweets))
+    rows = [[tweet.get('author_username', 'desconhecido'),  # Usa o username
+             tweet['text'].replace('\n', ' ').replace('\t', ' '),
+             tweet['id']] for tweet in new_tweets]
+    publisher.append_rows(TSV_HEADER, rows, filename, key_columns=["ID"])
+    # O índice só registra os IDs depois que as linhas foram gravadas
+    dedup_index.add(tweet['id'] for tweet in new_tweets)
+    logger.info(f"{len(new_tweets)} resultados acrescentados em {filename}")
 
 
-def buscar_tweets_e_mencoes():
-    parser = argparse.ArgumentParser(description="Buscar menções e tweets com hashtags.")
-    parser.add_argument("--username", type=str, default="casasbahia", help="Usuário para buscar menções.")
-    parser.add_argument("--hashtags", nargs="+", type=str, default=["blackfriday"],
-                        help="Lista de hashtags para buscar tweets.")
-    parser.add_argument("--max_results", type=int, default=40, help="Máximo de resultados (entre 10 e 100).")
-    args = parser.parse_args()
-
+# Parâmetros explícitos: o job não depende do sys.argv do processo que o chama
+def buscar_tweets_e_mencoes(username="casasbahia", hashtags=("blackfriday",), max_results=40):
     # Buscar menções ao usuário se o username for fornecido
-    if args.username:
-        mentions = fetch_mentions(args.username, args.max_results)
+    if username:
+        mentions, checkpoint = fetch_mentions(username, max_results)
         output_folder = config.X_TSV_FOLDER_IN
         os.makedirs(output_folder, exist_ok=True)
-        tsv_filename = os.path.join(output_folder, f"{args.username}_mentions.tsv")
+        tsv_filename = os.path.join(output_folder, f"{username}_mentions.tsv")
         save_to_tsv(mentions, tsv_filename)
+        # O cursor só avança depois que os tweets foram gravados
+        finish_search(mentions_query(username), checkpoint)
 
     # Buscar tweets com hashtags se hashtags forem fornecidas
-    if args.hashtags:
-        hashtag_tweets = fetch_tweets_by_hashtags(args.hashtags, args.max_results)
+    if hashtags:
+        hashtags = list(hashtags)
+        hashtag_tweets, checkpoint = fetch_tweets_by_hashtags(hashtags, max_results)
         tsv_filename = "hashtags_tweets.tsv"
         save_to_tsv(hashtag_tweets, tsv_filename)
+        finish_search(hashtags_query(hashtags), checkpoint)
+
+
+# Busca direcionada para hashtags que acabaram de entrar em alta: uma consulta (e um cursor) por hashtag,
+# com poucas páginas, para a primeira busca de uma hashtag muito movimentada não gastar a cota toda.
+# Só os tweets mais novos interessam: o cursor vai direto para o mais novo recebido, sem checkpoint
+# para voltar no tempo; o que ficou além do limite de páginas não é buscado depois
+def buscar_hashtags_em_alta(hashtags, max_results=100, max_pages=config.TENDENCIAS_PAGINAS):
+    output_folder = config.X_TSV_FOLDER_IN
+    os.makedirs(output_folder, exist_ok=True)
+    tsv_filename = os.path.join(output_folder, "hashtags_em_alta.tsv")
+    for hashtag in hashtags:
+        query = hashtags_query([hashtag])
+        tweets, checkpoint = search_recent(query, max_results, max_pages, resume=False)
+        save_to_tsv(tweets, tsv_filename)
+        advance_cursor(query, checkpoint['newest_id'])
+        # Checkpoints deixados por versões anteriores desta busca
+        stale_checkpoint = checkpoint_file(query, config.TWITTER_PAGINACAO_FOLDER)
+        if os.path.exists(stale_checkpoint):
+            os.remove(stale_checkpoint)
+
+
+# Backfill das mesmas consultas da coleta periódica, sem limite de páginas
+def backfill_tweets_e_mencoes(username="casasbahia", hashtags=("blackfriday",), max_pages=None, start_time=None):
+    if username:
+        output_folder = config.X_TSV_FOLDER_IN
+        os.makedirs(output_folder, exist_ok=True)
+        backfill(mentions_query(username), os.path.join(output_folder, f"{username}_mentions.tsv"),
+                 max_pages=max_pages, start_time=start_time)
+    if hashtags:
+        backfill(hashtags_query(list(hashtags)), "hashtags_tweets.tsv", max_pages=max_pages, start_time=start_time)
 
 
 if __name__ == "__main__":
-    buscar_tweets_e_mencoes()
+    botlogging.configure_logging("gettwitterposts")
+    parser = argparse.ArgumentParser(description="Buscar menções e tweets com hashtags.")
+    parser.add_argument("--username", type=str, default="casasbahia", help="Usuário para buscar menções.")
+    parser.add_argument("--hashtags", nargs="+", type=str, default=["blackfriday"],
+                        help="Lista de hashtags para buscar tweets.")
+    parser.add_argument("--max_results", type=int, default=40, help="Máximo de resultados (entre 10 e 100).")
+    args = parser.parse_args()
+    buscar_tweets_e_mencoes(args.username, args.hashtags, args.max_results)
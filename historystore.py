@@ -0,0 +1,162 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Fontes gravadas no histórico
+ALL_TRENDS = 'all_trends'
+PRODUTOS_CATEGORIA = 'produtos_categoria'
+PRODUTOS_ESTADO = 'produtos_estado'
+
+HISTORY_COLUMNS = ["run_at", "scope", "term", "value"]
+
+
+def _history_frame(rows):
+    frame = pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+    # Horários no fuso local, como os LastUpdate gravados nos TSVs
+    local_timezone = datetime.now().astimezone().tzinfo
+    frame["run_at"] = (pd.to_datetime(frame["run_at"], unit='s', utc=True)
+                       .dt.tz_convert(local_timezone).dt.tz_localize(None))
+    return frame
+
+
+class HistoryStore:
+    """
+    Histórico append-only (SQLite) de todas as coletas: cada execução grava as pontuações
+    de (escopo, termo) com o horário da execução. Os arquivos TSV atuais são gerados a
+    partir daqui, e as consultas de janela (velocidade, mudança de ranking, top-N) são
+    calculadas em pandas sobre as últimas execuções de cada escopo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    source TEXT NOT NULL,
+                    run_at REAL NOT NULL,
+                    scope TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    value REAL NOT NULL
+                )
+            """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_snapshots_scope ON snapshots (source, scope, run_at)")
+            self._connection.commit()
+        return self._connection
+
+    # Grava uma execução; frame precisa das colunas de termo e valor (e, opcionalmente, de escopo)
+    def append(self, source, frame, term_column, value_column, scope_column=None, scope='', run_at=None):
+        run_at = time.time() if run_at is None else run_at
+        if frame.empty:
+            return run_at
+
+        scopes = frame[scope_column].astype(str) if scope_column else pd.Series(scope, index=frame.index)
+        values = pd.to_numeric(frame[value_column], errors='coerce').fillna(0).astype(float)
+        rows = list(zip([source] * len(frame), [run_at] * len(frame), scopes,
+                        frame[term_column].astype(str), values))
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT INTO snapshots (source, run_at, scope, term, value) VALUES (?, ?, ?, ?, ?)", rows)
+            connection.commit()
+        logger.info(f"Histórico: {len(rows)} pontuações gravadas em {source}.")
+        return run_at
+
+    # Pontuações das últimas execuções de cada escopo (todas, se last_runs for None)
+    def history(self, source, last_runs=None, scope=None):
+        query = """
+            SELECT run_at, scope, term, value FROM (
+                SELECT run_at, scope, term, value,
+                       DENSE_RANK() OVER (PARTITION BY scope ORDER BY run_at DESC) AS run_rank
+                FROM snapshots WHERE source = ? {scope_filter}
+            ) {rank_filter}
+            ORDER BY scope, run_at, term
+        """.format(scope_filter="AND scope = ?" if scope is not None else "",
+                   rank_filter="WHERE run_rank <= ?" if last_runs is not None else "")
+        params = [source]
+        if scope is not None:
+            params.append(scope)
+        if last_runs is not None:
+            params.append(last_runs)
+
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return _history_frame(rows)
+
+    # Pontuações gravadas em uma execução específica (run_at devolvido por append)
+    def snapshot(self, source, run_at):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT run_at, scope, term, value FROM snapshots WHERE source = ? AND run_at = ? "
+                "ORDER BY value DESC", (source, run_at)).fetchall()
+        return _history_frame(rows)
+
+    # Última execução de cada escopo
+    def latest(self, source, scope=None):
+        return self.history(source, last_runs=1, scope=scope)
+
+    # Variação de cada termo entre a primeira e a última das N execuções, por hora e em pontos
+    def velocity(self, source, last_runs=5, scope=None):
+        frame = self.history(source, last_runs=last_runs, scope=scope)
+        if frame.empty:
+            return pd.DataFrame(columns=["scope", "term", "first", "last", "delta", "per_hour", "runs"])
+
+        frame = frame.sort_values("run_at")
+        grouped = frame.groupby(["scope", "term"])
+        result = grouped.agg(first=("value", "first"), last=("value", "last"),
+                             start=("run_at", "first"), end=("run_at", "last"), runs=("value", "size"))
+        result["delta"] = result["last"] - result["first"]
+        hours = (result["end"] - result["start"]).dt.total_seconds() / 3600
+        result["per_hour"] = (result["delta"] / hours.where(hours > 0)).fillna(0).round(3)
+        return (result.drop(columns=["start", "end"]).reset_index()
+                .sort_values(["scope", "per_hour"], ascending=[True, False], ignore_index=True))
+
+    # Posição de cada termo no ranking do escopo na última execução e na anterior
+    def rank_change(self, source, scope=None):
+        frame = self.history(source, last_runs=2, scope=scope)
+        if frame.empty:
+            return pd.DataFrame(columns=["scope", "term", "value", "rank", "previous_rank", "rank_change"])
+
+        frame["rank"] = frame.groupby(["scope", "run_at"])["value"].rank(method="min", ascending=False)
+        frame["run_rank"] = frame.groupby("scope")["run_at"].rank(method="dense", ascending=False)
+        current = frame[frame["run_rank"] == 1].set_index(["scope", "term"])
+        previous = frame[frame["run_rank"] == 2].set_index(["scope", "term"])["rank"]
+
+        result = current[["value", "rank"]].copy()
+        result["previous_rank"] = previous.reindex(result.index)
+        # Positivo = subiu no ranking; termos novos ficam sem posição anterior
+        result["rank_change"] = result["previous_rank"] - result["rank"]
+        return result.reset_index().sort_values(["scope", "rank"], ignore_index=True)
+
+    # Os N termos de maior pontuação média de cada escopo nas últimas execuções
+    def top_n(self, source, n=10, last_runs=1, scope=None):
+        frame = self.history(source, last_runs=last_runs, scope=scope)
+        if frame.empty:
+            return pd.DataFrame(columns=["scope", "term", "value", "run_at"])
+
+        result = frame.groupby(["scope", "term"], as_index=False).agg(
+            value=("value", "mean"), run_at=("run_at", "max"))
+        result = result.sort_values(["scope", "value"], ascending=[True, False])
+        return result.groupby("scope", sort=False).head(n).reset_index(drop=True)
+
+
+# Histórico único do processo
+history_store = HistoryStore(config.HISTORY_DB)
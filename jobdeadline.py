@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prazo do job em execução na thread atual
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """ O job passou do tempo máximo de execução e foi cancelado. """
+    pass
+
+
+class _Deadline:
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.expired = False
+        self._cleanups = []
+        self._lock = threading.Lock()
+
+    def add_cleanup(self, func):
+        with self._lock:
+            if not self.expired:
+                self._cleanups.append(func)
+                return
+        # O prazo já venceu: libera o recurso imediatamente
+        self._run_cleanup(func)
+
+    def remove_cleanup(self, func):
+        with self._lock:
+            if func in self._cleanups:
+                self._cleanups.remove(func)
+
+    # Chamado pelo timer quando o prazo vence, fora da thread do job
+    def expire(self):
+        with self._lock:
+            self.expired = True
+            cleanups, self._cleanups = self._cleanups, []
+        logger.error(f"Prazo de {self.seconds}s esgotado para o job {self.name}; cancelando.")
+        for func in reversed(cleanups):
+            self._run_cleanup(func)
+
+    def _run_cleanup(self, func):
+        try:
+            func()
+        except Exception as e:
+            logger.warning(f"Erro ao liberar recurso do job {self.name}: {e}")
+
+
+# Executa a função com um prazo máximo; ao vencer, roda as limpezas registradas e cancela o job
+def run_with_deadline(name, seconds, func, *args, **kwargs):
+    deadline = _Deadline(name, seconds)
+    _local.deadline = deadline
+    timer = threading.Timer(seconds, deadline.expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        result = func(*args, **kwargs)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Erros causados pela própria limpeza (ex.: navegador encerrado) são reportados como cancelamento
+        if deadline.expired:
+            raise DeadlineExceeded(f"Job {name} cancelado após {seconds}s") from e
+        raise
+    finally:
+        timer.cancel()
+        _local.deadline = None
+    if deadline.expired:
+        raise DeadlineExceeded(f"Job {name} cancelado após {seconds}s")
+    return result
+
+
+# Registra uma função de limpeza (ex.: driver.quit) a ser chamada se o prazo do job atual vencer
+def register_cleanup(func):
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None:
+        deadline.add_cleanup(func)
+
+
+def unregister_cleanup(func):
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None:
+        deadline.remove_cleanup(func)
+
+
+# Envolve a função para que ela rode em outra thread sob o mesmo prazo do job atual
+def propagate(func):
+    deadline = getattr(_local, 'deadline', None)
+
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'deadline', None)
+        _local.deadline = deadline
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.deadline = previous
+
+    return wrapper
+
+
+# Ponto de verificação: interrompe o job atual se o prazo já venceu
+def check_deadline():
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(f"Job {deadline.name} cancelado após {deadline.seconds}s")
+
+
+# Espera interrompível: acorda a cada segundo para respeitar o prazo do job atual
+def sleep(seconds):
+    end = time.monotonic() + seconds
+    while True:
+        check_deadline()
+        left = end - time.monotonic()
+        if left <= 0:
+            return
+        time.sleep(min(1.0, left))
+
+
+# Segundos restantes até o prazo do job atual (None fora de um job com prazo)
+def remaining():
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return None
+    return max(0.0, deadline.expires_at - time.monotonic())
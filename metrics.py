@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos histogramas de latência e duração
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+# Descrição de cada métrica, usada no "# HELP" do formato Prometheus
+DESCRIPTIONS = {
+    'cb_job_runs_total': 'Execuções de jobs por resultado.',
+    'cb_job_duration_seconds': 'Duração das execuções de cada job.',
+    'cb_http_requests_total': 'Requisições a serviços externos por endpoint e status.',
+    'cb_http_request_duration_seconds': 'Latência das requisições a serviços externos.',
+    'cb_http_retries_total': 'Novas tentativas de requisições por motivo.',
+    'cb_http_throttled_total': 'Respostas 429 recebidas de serviços externos.',
+    'cb_cache_requests_total': 'Consultas ao cache por resultado (hit/miss).',
+    'cb_rows_written_total': 'Linhas gravadas em cada arquivo de saída.',
+    'cb_publish_total': 'Publicações de arquivos de saída por resultado (written/unchanged/appended).',
+    'cb_cache_hit_ratio': 'Fração das consultas atendidas pelo cache.',
+    'cb_rate_limiter_rate_per_second': 'Taxa atual do limitador de requisições.',
+    'cb_rate_limiter_queue_depth': 'Chamadas aguardando um token do limitador.',
+    'cb_twitter_stream_tweets_total': 'Tweets recebidos pelo filtered stream.',
+    'cb_log_dropped_total': 'Registros de log descartados com a fila de gravação cheia.',
+    'cb_twitter_rate_limit_remaining': 'Requisições restantes na janela de limite da API do Twitter.',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra=()):
+    items = list(label_key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """
+    Registro em memória de contadores, gauges e histogramas, exportado em formato
+    Prometheus (texto) e em JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._gauge_callbacks = []
+
+    def inc(self, name, labels=None, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, labels=None, value=0):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, labels=None, value=0.0, buckets=DEFAULT_BUCKETS):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    # Mede a duração do bloco e registra no histograma
+    @contextmanager
+    def timer(self, name, labels=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - started)
+
+    # Gauges calculados na hora da leitura (ex.: taxa atual do limitador)
+    def register_gauge_callback(self, callback):
+        with self._lock:
+            self._gauge_callbacks.append(callback)
+
+    def _collect_callbacks(self):
+        for callback in list(self._gauge_callbacks):
+            try:
+                for name, labels, value in callback():
+                    self.set_gauge(name, labels, value)
+            except Exception as e:
+                logger.warning(f"Erro ao coletar métrica: {e}")
+
+    def snapshot(self):
+        self._collect_callbacks()
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'counters': {name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                             for name, series in self._counters.items()},
+                'gauges': {name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                           for name, series in self._gauges.items()},
+                'histograms': {name: [{'labels': dict(key), 'count': hist.count, 'sum': round(hist.sum, 6),
+                                       'buckets': dict(zip(map(str, hist.buckets), hist.counts))}
+                                      for key, hist in series.items()]
+                               for name, series in self._histograms.items()},
+            }
+
+    def render_prometheus(self):
+        self._collect_callbacks()
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+    def dump_json(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+
+# Registro único do processo
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+timer = registry.timer
+register_gauge_callback = registry.register_gauge_callback
+dump_json = registry.dump_json
+
+
+# Registra uma requisição a um serviço externo com sua latência
+def record_request(service, endpoint, status, duration):
+    labels = {'service': service, 'endpoint': endpoint}
+    registry.inc('cb_http_requests_total', dict(labels, status=str(status)))
+    registry.observe('cb_http_request_duration_seconds', labels, duration)
+    if str(status) == '429':
+        registry.inc('cb_http_throttled_total', {'service': service})
+
+
+def record_rows(output, rows):
+    registry.inc('cb_rows_written_total', {'output': os.path.basename(output)}, rows)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        elif self.path.startswith('/metrics'):
+            body = registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Sobe o endpoint /metrics (Prometheus) e /metrics.json em uma thread de fundo
+def start_http_server(port, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+    return server
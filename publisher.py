@@ -0,0 +1,239 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: só o lock entre threads do processo
+    fcntl = None
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_listeners = []
+
+
+# Registra uma função chamada a cada publicação: listener(path, entry, appended)
+def add_listener(listener):
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    _listeners.remove(listener)
+
+
+# Avisa os interessados fora do lock, para que um listener lento não segure outras publicações
+def _notify(path, entry, appended):
+    for listener in list(_listeners):
+        try:
+            listener(path, entry, appended)
+        except Exception as e:
+            logger.error(f"Erro ao notificar a publicação de {path}: {e}")
+
+
+# Trava das publicações: o lock entre threads e um lock de arquivo entre processos, já que a CLI,
+# os workers e o agendador gravam nos mesmos arquivos e fazem read-modify-write do mesmo manifesto
+@contextmanager
+def _publish_lock():
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(config.PUBLISH_MANIFEST) or '.', exist_ok=True)
+        with open(f"{config.PUBLISH_MANIFEST}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _manifest_key(path):
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def _load_manifest():
+    if not os.path.exists(config.PUBLISH_MANIFEST):
+        return {}
+    try:
+        with open(config.PUBLISH_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Manifesto de publicação ilegível, recriando: {e}")
+        return {}
+
+
+# Grava o conteúdo em um arquivo temporário na mesma pasta e troca pelo destino de uma vez
+def _write_atomic(path, data):
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _parse_rows(text):
+    rows = list(csv.reader(io.StringIO(text), delimiter='\t'))
+    return (rows[0], rows[1:]) if rows else ([], [])
+
+
+def _read_text(path):
+    if not os.path.exists(path):
+        return ''
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+# Linhas incluídas, removidas e alteradas entre duas versões, identificadas pelas colunas-chave
+def _diff(old_text, new_text, key_columns):
+    old_header, old_rows = _parse_rows(old_text)
+    new_header, new_rows = _parse_rows(new_text)
+
+    def index(header, rows):
+        if not all(column in header for column in key_columns):
+            return {}
+        positions = [header.index(column) for column in key_columns]
+        return {tuple(row[p] for p in positions): dict(zip(header, row))
+                for row in rows if len(row) == len(header)}
+
+    old, new = index(old_header, old_rows), index(new_header, new_rows)
+    changes = [('added', new[key]) for key in new if key not in old]
+    changes += [('removed', old[key]) for key in old if key not in new]
+    changes += [('changed', new[key]) for key in new if key in old and new[key] != old[key]]
+    return changes
+
+
+# Grava um JSONL por publicação e mantém apenas as versões mais recentes
+def _write_delta(path, version, published_at, changes):
+    if not config.PUBLISH_DELTAS or not changes:
+        return
+    name = os.path.splitext(os.path.basename(path))[0]
+    folder = config.PUBLISH_DELTAS_FOLDER
+    lines = [json.dumps({'version': version, 'published_at': published_at, 'op': op, 'row': row},
+                        ensure_ascii=False) for op, row in changes]
+    _write_atomic(os.path.join(folder, f"{name}.{version}.jsonl"), ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    oldest_kept = version - config.PUBLISH_DELTAS_MANTIDOS
+    for filename in os.listdir(folder):
+        prefix, _, suffix = filename.rpartition('.')[0].rpartition('.')
+        if prefix == name and suffix.isdigit() and int(suffix) <= oldest_kept:
+            os.remove(os.path.join(folder, filename))
+
+
+def _update_manifest(path, **entry):
+    manifest = _load_manifest()
+    manifest[_manifest_key(path)] = entry
+    _write_atomic(config.PUBLISH_MANIFEST,
+                  json.dumps(manifest, indent=2, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+
+# Publica o texto completo de um TSV; devolve False quando o conteúdo não mudou
+def publish_text(path, text, key_columns=None):
+    data = text.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    output = os.path.basename(path)
+
+    with _publish_lock():
+        previous = _load_manifest().get(_manifest_key(path), {})
+        if previous.get('sha256') == digest and os.path.exists(path):
+            metrics.inc('cb_publish_total', {'output': output, 'result': 'unchanged'})
+            logger.info(f"{path} sem alterações; publicação ignorada.")
+            return False
+
+        changes = _diff(_read_text(path), text, key_columns) if key_columns and config.PUBLISH_DELTAS else []
+        _write_atomic(path, data)
+
+        version = previous.get('version', 0) + 1
+        published_at = datetime.now().isoformat(timespec='seconds')
+        rows = len(_parse_rows(text)[1])
+        _write_delta(path, version, published_at, changes)
+        entry = dict(version=version, sha256=digest, rows=rows, published_at=published_at)
+        _update_manifest(path, **entry)
+
+    metrics.inc('cb_publish_total', {'output': output, 'result': 'written'})
+    metrics.record_rows(path, rows)
+    logger.info(f"{path} publicado (versão {version}, {rows} linhas, {len(changes)} alterações).")
+    _notify(path, entry, appended=False)
+    return True
+
+
+def publish_frame(frame, path, key_columns=None, **to_csv_kwargs):
+    to_csv_kwargs.setdefault('index', False)
+    return publish_text(path, frame.to_csv(sep='\t', **to_csv_kwargs), key_columns)
+
+
+def publish_rows(header, rows, path, key_columns=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter='\t')
+    writer.writerow(header)
+    writer.writerows(rows)
+    return publish_text(path, buffer.getvalue(), key_columns)
+
+
+# Acrescenta linhas a um TSV cumulativo (tweets). O arquivo novo (conteúdo atual + linhas novas) é
+# gravado em um temporário e trocado de uma vez, como nas demais publicações: quem lê nunca vê uma
+# linha pela metade. O hash do manifesto é o do arquivo inteiro e o delta traz só as linhas incluídas.
+def append_rows(header, rows, path, key_columns=None):
+    rows = list(rows)
+    if not rows:
+        return False
+
+    output = os.path.basename(path)
+    with _publish_lock():
+        previous = _load_manifest().get(_manifest_key(path), {})
+        current = b''
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                current = f.read()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter='\t')
+        write_header = not current
+        if write_header:
+            writer.writerow(header)
+        writer.writerows(rows)
+        data = current + buffer.getvalue().encode('utf-8')
+        _write_atomic(path, data)
+
+        version = previous.get('version', 0) + 1
+        published_at = datetime.now().isoformat(timespec='seconds')
+        if write_header:
+            total_rows = len(rows)
+        elif 'rows' in previous:
+            total_rows = previous['rows'] + len(rows)
+        else:
+            # Arquivo anterior ao manifesto: conta as linhas uma única vez
+            total_rows = len(_parse_rows(data.decode('utf-8'))[1])
+        if key_columns:
+            _write_delta(path, version, published_at, [('added', dict(zip(header, row))) for row in rows])
+        entry = dict(version=version, sha256=hashlib.sha256(data).hexdigest(), rows=total_rows,
+                     published_at=published_at)
+        _update_manifest(path, **entry)
+
+    metrics.inc('cb_publish_total', {'output': output, 'result': 'appended'})
+    metrics.record_rows(path, len(rows))
+    _notify(path, entry, appended=not write_header)
+    return True
+
+
+# Versão, hash, linhas e horário da última publicação de cada arquivo
+def manifest():
+    with _lock:
+        return _load_manifest()
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+
+import config
+import metrics
+from jobdeadline import check_deadline
+
+logger = logging.getLogger(__name__)
+
+
+# Verifica se a exceção representa um HTTP 429 (TooManyRequestsError do pytrends ou HTTPError do requests)
+def is_throttle_error(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429 or type(error).__name__ == 'TooManyRequestsError'
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket compartilhado entre threads com ajuste AIMD da taxa:
+    cada sucesso soma um incremento fixo à taxa e cada 429 divide a taxa pelo fator de recuo.
+    """
+
+    def __init__(self, name, initial_interval, min_interval, max_interval,
+                 rate_increase=0.01, backoff_factor=2.0, max_attempts=3):
+        self.name = name
+        self.min_rate = 1 / max_interval
+        self.max_rate = 1 / min_interval
+        self.rate = 1 / initial_interval
+        self.rate_increase = rate_increase
+        self.backoff_factor = backoff_factor
+        self.max_attempts = max_attempts
+
+        self._condition = threading.Condition()
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._waiting = 0
+        self._successes = 0
+        self._throttles = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(1.0, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    # Bloqueia até haver um token disponível
+    def acquire(self):
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    # Uma espera longa não pode segurar um job que já passou do prazo
+                    check_deadline()
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    self._condition.wait(timeout=min(1.0, (1 - self._tokens) / self.rate))
+            finally:
+                self._waiting -= 1
+
+    # Aumento aditivo da taxa após uma requisição bem-sucedida
+    def record_success(self):
+        with self._condition:
+            self._successes += 1
+            self.rate = min(self.max_rate, self.rate + self.rate_increase)
+
+    # Redução multiplicativa da taxa após um 429; o próximo token só sai depois de um intervalo inteiro
+    def record_throttle(self):
+        with self._condition:
+            self._throttles += 1
+            self.rate = max(self.min_rate, self.rate / self.backoff_factor)
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+            self._condition.notify_all()
+        logger.warning(f"[{self.name}] 429 recebido; intervalo ampliado para {1 / self.rate:.1f}s "
+                       f"({self.waiting} chamadas aguardando).")
+
+    # Executa a função respeitando o limite e repetindo a chamada quando o servidor responde 429
+    def call(self, func, *args, **kwargs):
+        endpoint = getattr(func, '__name__', 'call')
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire()
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None) or 'error'
+                metrics.record_request(self.name, endpoint, status, time.perf_counter() - started)
+                if not is_throttle_error(e):
+                    raise
+                self.record_throttle()
+                if attempt == self.max_attempts:
+                    raise
+                metrics.inc('cb_http_retries_total', {'service': self.name, 'reason': '429'})
+                continue
+            metrics.record_request(self.name, endpoint, 200, time.perf_counter() - started)
+            self.record_success()
+            return result
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def stats(self):
+        with self._condition:
+            return {
+                'name': self.name,
+                'rate_per_second': round(self.rate, 4),
+                'interval_seconds': round(1 / self.rate, 2),
+                'queue_depth': self._waiting,
+                'successes': self._successes,
+                'throttles': self._throttles,
+            }
+
+
+# Limitador único para todo o tráfego do Google Trends no processo
+google_trends_limiter = AdaptiveRateLimiter(
+    'google_trends',
+    initial_interval=config.GOOGLE_TRENDS_INTERVALO_INICIAL,
+    min_interval=config.GOOGLE_TRENDS_INTERVALO_MINIMO,
+    max_interval=config.GOOGLE_TRENDS_INTERVALO_MAXIMO,
+    max_attempts=config.GOOGLE_TRENDS_TENTATIVAS,
+)
+
+
+# Taxa e fila atuais do limitador, lidas a cada coleta de métricas
+def _limiter_gauges():
+    stats = google_trends_limiter.stats()
+    labels = {'limiter': stats['name']}
+    return [
+        ('cb_rate_limiter_rate_per_second', labels, stats['rate_per_second']),
+        ('cb_rate_limiter_queue_depth', labels, stats['queue_depth']),
+    ]
+
+
+metrics.register_gauge_callback(_limiter_gauges)
@@ -0,0 +1,239 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import config
+import publisher
+
+logger = logging.getLogger(__name__)
+
+
+class Output:
+    """ Última versão publicada de um TSV, já interpretada, e as respostas prontas para ela. """
+
+    def __init__(self, path, entry):
+        self.path = path
+        self.version = entry.get('version', 0)
+        self.sha256 = entry.get('sha256', '')
+        self.published_at = entry.get('published_at')
+        self.header = []
+        self.rows = []
+        self.offset = 0
+        self.responses = OrderedDict()
+        self.responses_lock = threading.Lock()
+
+    # Lê as linhas completas a partir do último byte lido (o arquivo inteiro na primeira vez)
+    def read(self, start=0):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline=''), delimiter='\t'))
+        if start == 0:
+            self.header, self.rows = (rows[0], rows[1:]) if rows else ([], [])
+        else:
+            self.rows.extend(rows)
+        self.offset = start + len(data)
+
+
+class OutputStore:
+    """
+    Saídas publicadas mantidas em memória. Cada publicação do processo atualiza a saída
+    correspondente (só as linhas novas, quando o arquivo recebeu um acréscimo), então as
+    consultas nunca leem o disco nem veem um arquivo pela metade.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outputs = {}
+
+    # Carrega tudo o que já está no manifesto e passa a acompanhar as próximas publicações
+    def start(self):
+        for key, entry in publisher.manifest().items():
+            self.refresh(key, entry)
+        publisher.add_listener(self.refresh)
+        return self
+
+    def stop(self):
+        publisher.remove_listener(self.refresh)
+
+    def refresh(self, path, entry, appended=False):
+        key = os.path.normpath(path).replace(os.sep, '/')
+        if not os.path.exists(path):
+            return
+        with self._lock:
+            current = self._outputs.get(key)
+        if current is not None and current.version > entry.get('version', 0):
+            return  # Notificação atrasada de uma versão já superada
+        output = Output(path, entry)
+        try:
+            if appended and current is not None and os.path.getsize(path) >= current.offset:
+                output.header, output.rows = current.header, list(current.rows)
+                output.read(current.offset)
+            else:
+                output.read()
+        except (OSError, ValueError) as e:
+            logger.error(f"Erro ao carregar {path} na API de leitura: {e}")
+            return
+        with self._lock:
+            self._outputs[key] = output
+
+    def get(self, key):
+        with self._lock:
+            return self._outputs.get(key)
+
+    def index(self):
+        with self._lock:
+            outputs = list(self._outputs.items())
+        return [{'output': key, 'version': output.version, 'rows': len(output.rows),
+                 'published_at': output.published_at} for key, output in sorted(outputs)]
+
+
+store = OutputStore()
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f"{name} não pode ser negativo")
+    return value
+
+
+# Linhas selecionadas pelos parâmetros: top (maiores valores da coluna "by"), offset e limit
+def select_rows(output, params):
+    rows = output.rows
+    top, by = _int_param(params, 'top'), params.get('by')
+    if by is not None:
+        if by not in output.header:
+            raise ValueError(f"coluna desconhecida: {by}")
+        column = output.header.index(by)
+
+        def value(row):
+            try:
+                return float(row[column])
+            except (IndexError, ValueError):
+                return float('-inf')
+
+        rows = sorted(rows, key=value, reverse=True)
+    if top is not None:
+        rows = rows[:top]
+    offset = _int_param(params, 'offset') or 0
+    limit = _int_param(params, 'limit')
+    return rows[offset:None if limit is None else offset + limit]
+
+
+def render(key, output, params, fmt):
+    rows = select_rows(output, params)
+    if fmt == 'tsv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter='\t')
+        writer.writerow(output.header)
+        writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8'), 'text/tab-separated-values; charset=utf-8'
+    payload = {'output': key, 'version': output.version, 'published_at': output.published_at,
+               'total': len(output.rows), 'columns': output.header,
+               'rows': [dict(zip(output.header, row)) for row in rows]}
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8'
+
+
+# Resposta pronta para (saída, versão, parâmetros, compressão), guardada até a próxima publicação
+def cached_response(key, output, params, fmt, use_gzip):
+    cache_key = (fmt, tuple(sorted(params.items())), use_gzip)
+    with output.responses_lock:
+        if cache_key in output.responses:
+            output.responses.move_to_end(cache_key)
+            return output.responses[cache_key]
+
+    body, content_type = render(key, output, params, fmt)
+    encoding = None
+    if use_gzip and len(body) >= config.READ_API_GZIP_MINIMO:
+        body, encoding = gzip.compress(body, compresslevel=5), 'gzip'
+    tag = hashlib.sha1(f"{output.sha256}|{output.version}|{cache_key}".encode('utf-8')).hexdigest()[:20]
+    response = (body, content_type, encoding, f'"{tag}"')
+
+    with output.responses_lock:
+        output.responses[cache_key] = response
+        while len(output.responses) > config.READ_API_RESPOSTAS_POR_SAIDA:
+            output.responses.popitem(last=False)
+    return response
+
+
+class _ReadHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}, ensure_ascii=False).encode('utf-8'))
+
+    # GET /outputs lista as saídas; GET /outputs/<caminho do TSV>?format=json|tsv&limit&offset&top&by
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') == '/outputs':
+            self._send(200, json.dumps(store.index(), ensure_ascii=False).encode('utf-8'),
+                       headers={'Cache-Control': 'no-cache'})
+            return
+        if not url.path.startswith('/outputs/'):
+            self._error(404, 'não encontrado')
+            return
+
+        key = unquote(url.path[len('/outputs/'):])
+        output = store.get(key)
+        if output is None:
+            self._error(404, f'saída desconhecida: {key}')
+            return
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        fmt = params.pop('format', 'json')
+        if fmt not in ('json', 'tsv'):
+            self._error(400, f'formato desconhecido: {fmt}')
+            return
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        try:
+            body, content_type, encoding, etag = cached_response(key, output, params, fmt, use_gzip)
+        except ValueError as e:
+            self._error(400, str(e))
+            return
+
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding',
+                   'X-Output-Version': str(output.version)}
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        self._send(200, body, content_type, headers)
+
+
+# Sobe a API de leitura em uma thread de fundo, alimentada pelas publicações deste processo
+def start_http_server(port, host='127.0.0.1'):
+    store.start()
+    server = ThreadingHTTPServer((host, port), _ReadHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='read-api-http', daemon=True).start()
+    logger.info(f"API de leitura disponível em http://{host}:{port}/outputs")
+    return server
@@ -0,0 +1,191 @@
+import heapq
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshPlanner:
+    """
+    Agenda de atualização por palavra-chave (SQLite). Cada termo guarda a média e a variância
+    (exponenciais) da sua pontuação relativa à âncora, o horário da última mudança e o próximo
+    prazo de atualização. Termos voláteis têm o intervalo reduzido pela metade; termos estáveis
+    dobram o intervalo a cada consulta sem mudança. As consultas de todos os jobs dividem um
+    orçamento de lotes por hora, e os termos vencidos saem por ordem de prazo.
+    """
+
+    def __init__(self, path, budget_per_hour, min_interval, initial_interval, max_interval, threshold, smoothing):
+        self.path = path
+        self.budget_per_hour = budget_per_hour
+        self.min_interval = min_interval
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._connection = None
+        # Reserva pendente de cada escopo (linha em spending, lotes reservados), acertada em settle
+        self._reservations = {}
+
+    def _connect(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS keywords (
+                    scope TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    mean REAL,
+                    variance REAL NOT NULL DEFAULT 0,
+                    last_value REAL,
+                    last_refresh REAL NOT NULL,
+                    last_change REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    next_due REAL NOT NULL,
+                    PRIMARY KEY (scope, keyword)
+                )
+            """)
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS spending (
+                    spent_at REAL NOT NULL,
+                    scope TEXT NOT NULL,
+                    units INTEGER NOT NULL
+                )
+            """)
+            self._connection.commit()
+        return self._connection
+
+    def _remaining(self, connection, now):
+        connection.execute("DELETE FROM spending WHERE spent_at <= ?", (now - 3600,))
+        spent = connection.execute("SELECT COALESCE(SUM(units), 0) FROM spending").fetchone()[0]
+        return max(0, self.budget_per_hour - spent)
+
+    # Lotes ainda disponíveis na última hora, somando o gasto (e as reservas) de todos os jobs
+    def remaining_budget(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            remaining = self._remaining(connection, now)
+            connection.commit()
+        return remaining
+
+    # Termos a atualizar agora: vencidos (ou nunca consultados), por ordem de prazo, até o orçamento.
+    # Os lotes dos termos escolhidos já saem reservados na mesma transação, então jobs simultâneos
+    # (neste ou em outro processo) não passam juntos pela mesma sobra do orçamento
+    def select(self, scope, keywords, keywords_per_unit, now=None):
+        now = time.time() if now is None else now
+        keywords = list(dict.fromkeys(keywords))
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            with connection:
+                rows = dict(connection.execute(
+                    "SELECT keyword, next_due FROM keywords WHERE scope = ?", (scope,)).fetchall())
+                due = [(rows.get(keyword, 0.0), position, keyword) for position, keyword in enumerate(keywords)
+                       if rows.get(keyword, 0.0) <= now]
+                limit = self._remaining(connection, now) * keywords_per_unit
+                selected = {keyword for _, _, keyword in heapq.nsmallest(limit, due)}
+                units = math.ceil(len(selected) / keywords_per_unit)
+                if units:
+                    cursor = connection.execute(
+                        "INSERT INTO spending (spent_at, scope, units) VALUES (?, ?, ?)", (now, scope, units))
+                    self._reservations[scope] = (cursor.lastrowid, units)
+        if len(selected) < len(due):
+            logger.warning(f"Orçamento do Google Trends esgotado: {len(due) - len(selected)} termos vencidos "
+                           f"de {scope} ficam para a próxima execução.")
+        logger.info(f"{scope}: {len(selected)} de {len(keywords)} termos com atualização prevista.")
+        # Mantém a ordem original, que define a composição dos lotes
+        return [keyword for keyword in keywords if keyword in selected]
+
+    # Acerta a reserva feita em select com os lotes que de fato vão à rede (os servidos pelo cache não
+    # gastam o orçamento). Sem reserva neste processo (retomada de uma seleção anterior), só cobra os usados
+    def settle(self, scope, used, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            rowid, reserved = self._reservations.pop(scope, (None, 0))
+            if rowid is not None:
+                connection.execute("UPDATE spending SET units = ? WHERE rowid = ?", (used, rowid))
+            elif used:
+                connection.execute(
+                    "INSERT INTO spending (spent_at, scope, units) VALUES (?, ?, ?)", (now, scope, used))
+            connection.commit()
+        if used < reserved:
+            logger.info(f"{scope}: {reserved - used} lotes reservados vieram do cache e voltaram ao orçamento.")
+
+    # Próximo intervalo do termo a partir da nova pontuação (None quando não houve dados)
+    def _next_state(self, row, value, now):
+        if row is None:
+            return (value, 0.0, value, now, now, self.initial_interval)
+        mean, variance, last_value, _, last_change, interval = row
+        if value is None:
+            return (mean, variance, last_value, now, last_change, min(self.max_interval, interval * 2))
+        if mean is None:
+            return (value, 0.0, value, now, now, interval)
+
+        # Média e variância exponenciais da pontuação
+        delta = value - mean
+        mean += self.smoothing * delta
+        variance = (1 - self.smoothing) * (variance + self.smoothing * delta * delta)
+        scale = max(abs(mean), 1e-9)
+        change = abs(value - last_value) / max(abs(last_value), 1e-9) if last_value is not None else 0.0
+        if change >= self.threshold:
+            last_change = now
+        if change >= self.threshold or math.sqrt(variance) / scale >= self.threshold:
+            interval = max(self.min_interval, interval / 2)
+        else:
+            interval = min(self.max_interval, interval * 2)
+        return (mean, variance, value, now, last_change, interval)
+
+    # Registra as pontuações consultadas (termo -> valor relativo à âncora) e calcula o próximo prazo
+    def record(self, scope, values, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            rows = {row[0]: row[1:] for row in connection.execute(
+                "SELECT keyword, mean, variance, last_value, last_refresh, last_change, interval "
+                "FROM keywords WHERE scope = ?", (scope,)).fetchall()}
+            updates = []
+            for keyword, value in values.items():
+                state = self._next_state(rows.get(keyword), value, now)
+                updates.append((scope, keyword) + state + (now + state[-1],))
+            connection.executemany(
+                "INSERT OR REPLACE INTO keywords (scope, keyword, mean, variance, last_value, last_refresh, "
+                "last_change, interval, next_due) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", updates)
+            connection.commit()
+
+    # Última pontuação relativa à âncora de cada termo, para completar os que não foram consultados
+    def last_values(self, scope, keywords):
+        keywords = list(keywords)
+        if not keywords:
+            return {}
+        placeholders = ','.join('?' * len(keywords))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT keyword, last_value FROM keywords WHERE scope = ? AND keyword IN ({placeholders}) "
+                f"AND last_value IS NOT NULL", [scope] + keywords).fetchall()
+        return dict(rows)
+
+    def stats(self, scope):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT keyword, interval, next_due, last_change FROM keywords WHERE scope = ? ORDER BY next_due",
+                (scope,)).fetchall()
+        return [{'keyword': keyword, 'interval': interval, 'next_due': next_due, 'last_change': last_change}
+                for keyword, interval, next_due, last_change in rows]
+
+
+# Agenda única do processo, compartilhada pelos jobs do Google Trends
+refresh_planner = RefreshPlanner(
+    config.TRENDS_AGENDA_DB, config.TRENDS_AGENDA_LOTES_POR_HORA, config.TRENDS_AGENDA_INTERVALO_MINIMO,
+    config.TRENDS_AGENDA_INTERVALO_INICIAL, config.TRENDS_AGENDA_INTERVALO_MAXIMO,
+    config.TRENDS_AGENDA_LIMIAR, config.TRENDS_AGENDA_SUAVIZACAO)
@@ -0,0 +1,53 @@
+import csv
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'teste')
+
+import config
+import gettwitterposts
+from benchmarks.fakeservers import FakeTwitterApi
+
+
+class BuscaHashtagsEmAltaTest(unittest.TestCase):
+    """ Disparos seguidos para a mesma hashtag em alta só trazem tweets mais novos que os já coletados. """
+
+    def setUp(self):
+        self.api = FakeTwitterApi(tweets_per_query=250).start()
+        self.previous_cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+        self.previous_url = gettwitterposts.search_url
+        gettwitterposts.search_url = f"{self.api.base_url}/2/tweets/search/recent"
+
+    def tearDown(self):
+        gettwitterposts.search_url = self.previous_url
+        os.chdir(self.previous_cwd)
+        self.workdir.cleanup()
+        self.api.stop()
+
+    def saved_ids(self):
+        path = os.path.join(config.X_TSV_FOLDER_IN, "hashtags_em_alta.tsv")
+        with open(path, newline='', encoding='utf-8') as f:
+            return [int(row["ID"]) for row in csv.DictReader(f, delimiter='\t')]
+
+    def test_segundo_disparo_traz_so_tweets_mais_novos(self):
+        # Hashtag movimentada: 250 tweets e uma única página de 100 por disparo
+        gettwitterposts.buscar_hashtags_em_alta(["novidade"], max_results=100, max_pages=1)
+        primeiro = self.saved_ids()
+        self.assertEqual(len(primeiro), 100)
+
+        # Chegam 30 tweets novos antes do próximo disparo
+        self.api.tweets_per_query = 280
+        gettwitterposts.buscar_hashtags_em_alta(["novidade"], max_results=100, max_pages=1)
+        segundo = self.saved_ids()[len(primeiro):]
+
+        self.assertEqual(len(segundo), 30)
+        self.assertTrue(min(segundo) > max(primeiro))
+        self.assertFalse(os.path.exists(config.TWITTER_PAGINACAO_FOLDER)
+                         and os.listdir(config.TWITTER_PAGINACAO_FOLDER))
+
+
+if __name__ == "__main__":
+    unittest.main()
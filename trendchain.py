@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import config
+import publisher
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = 'hashtagsemalta'
+ALL_TRENDS_FILE = os.path.normpath(os.path.join(config.WORD_TSV_FOLDER_IN, "all_trends.tsv"))
+
+
+class TrendChain:
+    """
+    Liga a coleta de tendências à busca de tweets: a cada publicação do all_trends, compara o
+    topo das plataformas com o anterior e agenda uma busca só para as hashtags que entraram.
+    Mudanças seguidas dentro da espera viram um único disparo, e cada disparo busca no máximo
+    max_fetches hashtags; as que sobram saem no disparo seguinte, se ainda estiverem no topo.
+    """
+
+    def __init__(self, scheduler, fetch, top_n=config.TENDENCIAS_TOP, debounce=config.TENDENCIAS_ESPERA,
+                 max_fetches=config.TENDENCIAS_MAX_BUSCAS, state_file=config.TENDENCIAS_STATE_FILE,
+                 executor='twitter'):
+        self.scheduler = scheduler
+        self.fetch = fetch
+        self.top_n = top_n
+        self.debounce = debounce
+        self.max_fetches = max_fetches
+        self.state_file = state_file
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        state = {'top': [], 'pending': []}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, encoding='utf-8') as f:
+                state.update(json.load(f))
+        return state
+
+    def _save(self):
+        folder = os.path.dirname(self.state_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{self.state_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.state_file)
+
+    # Passa a reagir às publicações; hashtags que ficaram pendentes antes de reiniciar são agendadas
+    def start(self):
+        publisher.add_listener(self.on_publish)
+        with self._lock:
+            if self._state['pending']:
+                self._schedule()
+        return self
+
+    def stop(self):
+        publisher.remove_listener(self.on_publish)
+
+    def on_publish(self, path, entry, appended):
+        if os.path.normpath(path) == ALL_TRENDS_FILE:
+            self.trends_changed()
+
+    # Compara o topo atual com o anterior; devolve as hashtags que entraram
+    def trends_changed(self):
+        import gethashtags
+
+        current = [hashtag.lower() for hashtag in gethashtags.top_platform_hashtags(self.top_n)]
+        with self._lock:
+            previous = set(self._state['top'])
+            pending = [hashtag for hashtag in self._state['pending'] if hashtag in current]
+            new = [hashtag for hashtag in current if hashtag not in previous and hashtag not in pending]
+            if current == self._state['top'] and pending == self._state['pending']:
+                return []
+            self._state = {'top': current, 'pending': pending + new}
+            self._save()
+            if new:
+                logger.info(f"Hashtags novas no topo das tendências: {', '.join(new)}.")
+                self._schedule()
+        return new
+
+    # Agenda (ou adia, se já agendado) o disparo para depois da espera
+    def _schedule(self):
+        self.scheduler.add_job(self._fire, 'date', id=JOB_ID, replace_existing=True, executor=self.executor,
+                               run_date=datetime.now() + timedelta(seconds=self.debounce))
+
+    def _fire(self):
+        with self._lock:
+            batch = self._state['pending'][:self.max_fetches]
+            self._state['pending'] = self._state['pending'][self.max_fetches:]
+            self._save()
+            if self._state['pending']:
+                self._schedule()
+        if batch:
+            self.fetch(batch)
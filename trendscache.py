@@ -0,0 +1,134 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TrendsCache:
+    """
+    Cache persistente (SQLite) das respostas do pytrends, com validade por timeframe
+    e descarte dos itens menos usados recentemente quando passa do limite de entradas.
+    """
+
+    def __init__(self, path, max_entries, ttls, default_ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access)")
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def make_key(endpoint, keywords, timeframe, geo, resolution):
+        return '|'.join([endpoint, ','.join(keywords), timeframe or '', geo or '', resolution or ''])
+
+    def ttl_for(self, timeframe):
+        return self.ttls.get(timeframe, self.default_ttl)
+
+    # Devolve o valor em cache ainda válido ou None
+    def get(self, endpoint, keywords, timeframe, geo, resolution):
+        key = self.make_key(endpoint, keywords, timeframe, geo, resolution)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT payload FROM responses WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc('cb_cache_requests_total', {'cache': 'google_trends', 'result': 'miss'})
+                return None
+            connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+        metrics.inc('cb_cache_requests_total', {'cache': 'google_trends', 'result': 'hit'})
+        return pickle.loads(row[0])
+
+    # Indica se há valor válido em cache, sem contar como acerto ou ausência
+    def contains(self, endpoint, keywords, timeframe, geo, resolution):
+        key = self.make_key(endpoint, keywords, timeframe, geo, resolution)
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row is not None
+
+    def set(self, endpoint, keywords, timeframe, geo, resolution, value):
+        key = self.make_key(endpoint, keywords, timeframe, geo, resolution)
+        now = time.time()
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, payload, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, payload, now, now + self.ttl_for(timeframe), now))
+            # Remove os expirados e, se ainda passar do limite, os menos usados recentemente
+            connection.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            connection.commit()
+
+    # Consulta o cache e, em caso de ausência, executa a função e guarda o resultado
+    def get_or_fetch(self, endpoint, keywords, timeframe, geo, resolution, fetch):
+        cached = self.get(endpoint, keywords, timeframe, geo, resolution)
+        if cached is not None:
+            logger.info(f"Cache do Google Trends: acerto para {endpoint} {', '.join(keywords)} ({timeframe}).")
+            return cached
+
+        value = fetch()
+        # Respostas vazias costumam indicar bloqueio temporário; não vale a pena guardá-las
+        if value is not None and not getattr(value, 'empty', False):
+            self.set(endpoint, keywords, timeframe, geo, resolution, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Cache único do processo para todas as consultas ao Google Trends
+trends_cache = TrendsCache(
+    config.TRENDS_CACHE_DB,
+    max_entries=config.TRENDS_CACHE_MAX_ENTRADAS,
+    ttls=config.TRENDS_CACHE_TTL,
+    default_ttl=config.TRENDS_CACHE_TTL_PADRAO,
+)
+
+
+metrics.register_gauge_callback(
+    lambda: [('cb_cache_hit_ratio', {'cache': 'google_trends'}, trends_cache.stats()['hit_ratio'])])
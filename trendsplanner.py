@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import pandas as pd
+
+import config
+import jobdeadline
+import workqueue
+from jobdeadline import DeadlineExceeded, check_deadline
+from ratelimiter import google_trends_limiter
+from trendscache import trends_cache
+
+logger = logging.getLogger(__name__)
+
+# Máximo de termos aceitos pelo Google Trends em uma única consulta
+MAX_TERMOS_POR_CONSULTA = 5
+
+INTEREST_OVER_TIME = 'interest_over_time'
+INTEREST_BY_REGION = 'interest_by_region'
+TRENDING_SEARCHES = 'trending_searches'
+
+# Unidades de trabalho do Google Trends na fila compartilhada com os workers
+FILA_TRENDS = 'google_trends'
+
+# O TrendReq guarda o payload da última consulta, então cada thread usa o seu
+_local = threading.local()
+# Proxies usados pelos clientes deste processo (cada worker pode sair por um IP diferente)
+_proxies = None
+
+
+# Função para apontar o pytrends para config.GOOGLE_TRENDS_BASE_URL; o pytrends guarda as URLs fixas na classe
+def _apply_base_url():
+    import pytrends.request
+    from pytrends.request import TrendReq
+
+    default_base = pytrends.request.BASE_TRENDS_URL
+    if default_base == config.GOOGLE_TRENDS_BASE_URL:
+        return
+    for name, value in list(vars(TrendReq).items()):
+        if name.endswith('_URL') and isinstance(value, str):
+            setattr(TrendReq, name, value.replace(default_base, config.GOOGLE_TRENDS_BASE_URL, 1))
+    pytrends.request.BASE_TRENDS_URL = config.GOOGLE_TRENDS_BASE_URL
+    logger.info(f"pytrends apontado para {config.GOOGLE_TRENDS_BASE_URL}")
+
+
+# Função para definir os proxies dos clientes criados a partir de agora neste processo
+def configure_proxies(proxies):
+    global _proxies
+    _proxies = list(proxies) if proxies else None
+
+
+# Função para criar um cliente do pytrends com a configuração padrão do projeto
+def create_client():
+    # O pytrends só é importado quando um cliente é realmente criado
+    from pytrends.request import TrendReq
+
+    _apply_base_url()
+    # A criação do cliente já faz uma requisição ao Google para obter os cookies
+    if _proxies:
+        return google_trends_limiter.call(TrendReq, hl='pt-BR', tz=360, proxies=_proxies)
+    return google_trends_limiter.call(TrendReq, hl='pt-BR', tz=360)
+
+
+# Função para obter o cliente da thread atual, criado só quando alguma consulta realmente vai à rede
+def get_client():
+    if getattr(_local, 'client', None) is None:
+        _local.client = create_client()
+    return _local.client
+
+
+# Função para obter as pesquisas em alta do dia, passando pelo cache
+def trending_searches(pn='brazil'):
+    return trends_cache.get_or_fetch(
+        TRENDING_SEARCHES, [pn], None, None, None,
+        lambda: google_trends_limiter.call(get_client().trending_searches, pn=pn))
+
+
+# Função para dividir as palavras-chave em lotes de até cinco termos, sempre incluindo a âncora
+def plan_batches(keywords, anchor=config.GOOGLE_TRENDS_ANCHOR, size=MAX_TERMOS_POR_CONSULTA):
+    unique_keywords = [kw for kw in dict.fromkeys(keywords) if kw != anchor]
+    step = size - 1
+    return [unique_keywords[i:i + step] + [anchor] for i in range(0, len(unique_keywords), step)]
+
+
+# Função para consultar um único lote e devolver os valores brutos (ainda na escala do próprio lote)
+def fetch_batch(batch, endpoint=INTEREST_OVER_TIME, timeframe='now 7-d', geo='BR', resolution='REGION'):
+    # Lotes repetidos dentro da validade do cache não geram nenhuma requisição
+    return trends_cache.get_or_fetch(
+        endpoint, batch, timeframe, geo, resolution,
+        lambda: _request_batch(get_client(), batch, endpoint, timeframe, geo, resolution))
+
+
+def _request_batch(client, batch, endpoint, timeframe, geo, resolution):
+    # Cada requisição ao Google passa pelo limitador compartilhado do processo
+    google_trends_limiter.call(client.build_payload, batch, timeframe=timeframe, geo=geo)
+
+    if endpoint == INTEREST_OVER_TIME:
+        data = google_trends_limiter.call(client.interest_over_time)
+        if data.empty:
+            return pd.DataFrame(columns=batch)
+        return data[batch]
+
+    if endpoint == INTEREST_BY_REGION:
+        data = google_trends_limiter.call(client.interest_by_region, resolution=resolution, inc_geo_code=True)
+        if data.empty:
+            return pd.DataFrame(columns=batch)
+        # Indexa pelo código da região ("BR-SP") quando disponível, que é estável entre idiomas
+        if 'geoCode' in data.columns:
+            data = data.set_index('geoCode')
+        return data[batch]
+
+    raise ValueError(f"Endpoint desconhecido: {endpoint}")
+
+
+# Função para contar os lotes que ainda não estão no cache, ou seja, os que de fato vão à rede
+def uncached_batches(batches, endpoint=INTEREST_OVER_TIME, timeframe='now 7-d', geo='BR', resolution='REGION'):
+    return sum(1 for batch in batches if not trends_cache.contains(endpoint, batch, timeframe, geo, resolution))
+
+
+# Executa uma unidade da fila (usado pelos workers e pelo coordenador)
+def process_unit(payload):
+    return fetch_batch(payload['batch'], payload['endpoint'], payload['timeframe'], payload['geo'],
+                       payload['resolution'])
+
+
+# Função para consultar vários lotes, devolvendo (posição, dados) à medida que cada um fica pronto
+def fetch_batches(batches, endpoint=INTEREST_OVER_TIME, timeframe='now 7-d', geo='BR', resolution='REGION'):
+    if config.TRENDS_FILA_ATIVA:
+        yield from _fetch_batches_queued(batches, endpoint, timeframe, geo, resolution)
+        return
+
+    for index, batch in enumerate(batches):
+        try:
+            yield index, fetch_batch(batch, endpoint, timeframe, geo, resolution)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Erro ao consultar o lote {', '.join(batch)}: {e}")
+
+
+# Coordenador: publica os lotes na fila e recolhe os resultados gravados pelos workers
+def _fetch_batches_queued(batches, endpoint, timeframe, geo, resolution):
+    queue = workqueue.get_queue()
+    worker = f"coordenador-{os.getpid()}-{threading.get_ident()}"
+
+    pending = {}
+    for index, batch in enumerate(batches):
+        # Lotes em cache nem passam pela fila
+        cached = trends_cache.get(endpoint, batch, timeframe, geo, resolution)
+        if cached is not None:
+            yield index, cached
+            continue
+        key = trends_cache.make_key(endpoint, batch, timeframe, geo, resolution)
+        pending[key] = (index, {'batch': batch, 'endpoint': endpoint, 'timeframe': timeframe,
+                                'geo': geo, 'resolution': resolution})
+    if not pending:
+        return
+
+    queue.submit(FILA_TRENDS, {key: payload for key, (_, payload) in pending.items()})
+    logger.info(f"{len(pending)} lotes enviados para a fila de workers do Google Trends.")
+
+    while pending:
+        check_deadline()
+        finished = queue.finished(FILA_TRENDS, pending)
+        if finished:
+            queue.forget(FILA_TRENDS, finished)
+        for key, (status, result, error) in finished.items():
+            index, payload = pending.pop(key)
+            if status == workqueue.DONE:
+                yield index, result
+            else:
+                logger.error(f"Erro ao consultar o lote {', '.join(payload['batch'])}: {error}")
+        if not pending:
+            break
+        # Sem workers livres, o próprio coordenador também processa unidades
+        if config.TRENDS_FILA_COORDENADOR_PROCESSA and workqueue.work_one(queue, FILA_TRENDS, process_unit, worker):
+            continue
+        jobdeadline.sleep(config.TRENDS_FILA_INTERVALO)
+
+
+# Função para colocar todos os lotes na escala do primeiro lote usando o termo âncora
+def combine_batches(frames, anchor=config.GOOGLE_TRENDS_ANCHOR, endpoint=INTEREST_OVER_TIME):
+    frames = [frame.apply(pd.to_numeric, errors='coerce') for frame in frames
+              if not frame.empty and anchor in frame.columns]
+    if not frames:
+        return pd.DataFrame()
+
+    # A referência é o primeiro lote em que a âncora teve volume
+    reference = next((frame[anchor] for frame in frames if frame[anchor].sum() > 0), frames[0][anchor])
+    scaled_frames = []
+    for frame in frames:
+        terms = frame.drop(columns=[anchor])
+        if endpoint == INTEREST_BY_REGION:
+            # Cada região tem seu próprio fator: compara o termo com a âncora dentro da mesma região
+            factor = reference.reindex(frame.index) / frame[anchor]
+            factor = factor.replace([float('inf'), -float('inf')], float('nan')).fillna(1)
+            scaled_frames.append(terms.mul(factor, axis=0))
+        else:
+            anchor_level = frame[anchor].mean()
+            if not anchor_level:
+                logger.warning(f"Âncora sem volume no lote {list(terms.columns)}; mantendo a escala original.")
+                factor = 1
+            else:
+                factor = reference.mean() / anchor_level
+            scaled_frames.append(terms * factor)
+
+    scaled_frames.append(reference.to_frame())
+    combined = pd.concat(scaled_frames, axis=1).sort_index()
+    combined = combined.loc[:, ~combined.columns.duplicated()]
+
+    if endpoint == INTEREST_OVER_TIME:
+        # Lotes consultados em momentos diferentes podem ter pontos ligeiramente desalinhados
+        combined = combined.ffill()
+    combined = combined.fillna(0)
+
+    # Normaliza para que o maior valor de todos os lotes seja 100, como no próprio Google Trends
+    peak = combined.to_numpy().max() if combined.size else 0
+    if peak > 0:
+        combined = combined * (100 / peak)
+    return combined
+
+
+# Função para medir cada termo em unidades da âncora, escala que não muda entre execuções (None sem volume)
+def anchor_ratios(frame, keywords, anchor=config.GOOGLE_TRENDS_ANCHOR):
+    if frame.empty or anchor not in frame.columns or not frame[anchor].sum():
+        return {keyword: None for keyword in keywords}
+    anchor_total = frame[anchor].sum()
+    return {keyword: float(frame[keyword].sum() / anchor_total) if keyword in frame.columns else None
+            for keyword in keywords}
+
+
+# Função principal: consulta qualquer lista de palavras-chave em lotes e devolve tudo na mesma escala
+def fetch_interest(keywords, endpoint=INTEREST_OVER_TIME, timeframe='now 7-d', geo='BR', resolution='REGION',
+                   anchor=config.GOOGLE_TRENDS_ANCHOR):
+    batches = plan_batches(keywords, anchor=anchor)
+    if not batches:
+        return pd.DataFrame()
+
+    logger.info(f"Consultando {len(keywords)} termos em {len(batches)} lotes ({endpoint}, {timeframe}, {geo}).")
+
+    # A ordem original dos lotes define a referência da escala
+    frames = dict(fetch_batches(batches, endpoint, timeframe, geo, resolution))
+    return combine_batches([frames[index] for index in sorted(frames)], anchor=anchor, endpoint=endpoint)
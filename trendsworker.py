@@ -0,0 +1,30 @@
+import argparse
+import logging
+import os
+import socket
+
+import botlogging
+import config
+import trendsplanner
+import workqueue
+
+logger = logging.getLogger(__name__)
+
+
+# Processo worker: consome os lotes do Google Trends da fila, com seus próprios proxies e limitador
+def run_trends_worker(worker_id=None, proxies=None, idle_exit=None):
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    trendsplanner.configure_proxies(proxies)
+    workqueue.run_worker(workqueue.get_queue(), trendsplanner.FILA_TRENDS, trendsplanner.process_unit,
+                         worker_id, config.TRENDS_FILA_INTERVALO, idle_exit=idle_exit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker da fila de consultas ao Google Trends.")
+    parser.add_argument("--id", type=str, help="Identificação do worker (padrão: host-pid).")
+    parser.add_argument("--proxy", action="append", help="Proxy HTTPS do worker (pode repetir).")
+    parser.add_argument("--sair-ocioso", type=float, help="Encerra após tantos segundos sem trabalho.")
+    args = parser.parse_args()
+    # Cada worker grava no seu próprio arquivo de log
+    botlogging.configure_logging(f"trendsworker_{args.id or os.getpid()}")
+    run_trends_worker(args.id, args.proxy, args.sair_ocioso)
@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+import time
+from array import array
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Época dos IDs "snowflake" do Twitter (ms): os bits acima do 22º são o instante de criação
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def tweet_timestamp(tweet_id):
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000
+
+
+# Menor ID possível para um tweet criado no instante informado
+def min_id_for_timestamp(timestamp):
+    return max(0, int(timestamp * 1000) - TWITTER_EPOCH_MS) << 22
+
+
+class TweetDedupIndex:
+    """
+    Índice persistente dos IDs de tweets já gravados em um arquivo. Em memória é um set
+    (consulta O(1)); em disco, um array ordenado de inteiros de 64 bits. IDs mais antigos que
+    a retenção são descartados pelo instante embutido no próprio ID, o que mantém memória e
+    disco limitados ao volume da janela de retenção.
+    """
+
+    def __init__(self, path, retention, seed=None):
+        self.path = path
+        self.retention = retention
+        self._seed = seed
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._ids is not None:
+            return
+        ids = array('Q')
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                ids.frombytes(f.read())
+            self._ids = set(ids)
+        else:
+            # Primeira execução: parte dos IDs que já estão no arquivo de saída
+            self._ids = {int(tweet_id) for tweet_id in (self._seed() if self._seed else ()) if tweet_id.isdigit()}
+        self._prune()
+
+    def _prune(self):
+        cutoff = min_id_for_timestamp(time.time() - self.retention)
+        self._ids = {tweet_id for tweet_id in self._ids if tweet_id >= cutoff}
+
+    # Tweets ainda não vistos, na ordem recebida e sem repetições dentro do próprio lote.
+    # Tweets anteriores à retenção não podem ser conferidos e ficam de fora (a busca recente
+    # não os devolve, então só aparecem em reprocessamentos de dados antigos).
+    def filter_new(self, tweets):
+        with self._lock:
+            self._load()
+            cutoff = min_id_for_timestamp(time.time() - self.retention)
+            seen = set()
+            new_tweets = []
+            for tweet in tweets:
+                tweet_id = int(tweet['id'])
+                if tweet_id < cutoff or tweet_id in self._ids or tweet_id in seen:
+                    continue
+                seen.add(tweet_id)
+                new_tweets.append(tweet)
+            return new_tweets
+
+    # Marca os IDs como gravados e persiste o índice (arquivo temporário + rename)
+    def add(self, tweet_ids):
+        with self._lock:
+            self._load()
+            self._ids.update(int(tweet_id) for tweet_id in tweet_ids)
+            self._prune()
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'wb') as f:
+                array('Q', sorted(self._ids)).tofile(f)
+            os.replace(temp_path, self.path)
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._ids)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# Índice de um arquivo de saída de tweets; seed devolve os IDs já gravados, usados na primeira execução
+def get_index(filename, seed=None):
+    with _indexes_lock:
+        if filename not in _indexes:
+            path = os.path.join(config.TWITTER_DEDUP_FOLDER, f"{os.path.basename(filename)}.ids")
+            _indexes[filename] = TweetDedupIndex(path, config.TWITTER_DEDUP_RETENCAO, seed)
+        return _indexes[filename]
@@ -0,0 +1,169 @@
+import glob
+import io
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+import botlogging
+import config
+from tweetdedup import TWITTER_EPOCH_MS
+
+logger = logging.getLogger(__name__)
+
+TWEET_COLUMNS = ["Autor", "Texto", "ID"]
+HASHTAG_PATTERN = r'#\w+'
+
+
+class TweetTermsAggregator:
+    """
+    Contagem incremental de hashtags e termos de produtos nos tweets já coletados. Cada execução
+    lê só as linhas novas dos TSVs (a partir do último byte lido), soma as contagens em baldes
+    de tempo pelo instante embutido no ID de cada tweet e descarta os baldes que saíram da
+    janela, mantendo o total da janela atualizado sem recontar os tweets antigos.
+    """
+
+    def __init__(self, state_file, window, bucket, terms):
+        self.state_file = state_file
+        self.window = window
+        self.bucket = bucket
+        self.terms = list(terms)
+        self._state = None
+
+    def _load(self):
+        if self._state is None:
+            state = {'offsets': {}, 'buckets': {}, 'totals': {}}
+            if os.path.exists(self.state_file):
+                with open(self.state_file, encoding='utf-8') as f:
+                    state.update(json.load(f))
+            self._state = state
+        return self._state
+
+    def _save(self):
+        folder = os.path.dirname(self.state_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{self.state_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_file)
+
+    # Linhas completas acrescentadas ao arquivo desde a última leitura
+    def _read_new_rows(self, filename):
+        offsets = self._state['offsets']
+        offset = offsets.get(filename, 0)
+        size = os.path.getsize(filename)
+        if size < offset:
+            # Arquivo reescrito: recomeça do início
+            offset = 0
+        if size == offset:
+            return pd.DataFrame(columns=TWEET_COLUMNS)
+
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # Uma linha ainda incompleta fica para a próxima leitura
+        data = data[:data.rfind(b'\n') + 1]
+        offsets[filename] = offset + len(data)
+
+        rows = pd.read_csv(io.BytesIO(data), sep='\t', names=TWEET_COLUMNS, header=None, dtype=str,
+                           encoding='utf-8', on_bad_lines='skip')
+        if offset == 0:
+            rows = rows[rows["ID"] != "ID"]
+        return rows.dropna(subset=["Texto", "ID"])
+
+    # Contagens por (balde, termo) de um lote de tweets, extraídas com operações vetorizadas
+    def _count(self, rows):
+        ids = pd.to_numeric(rows["ID"], errors='coerce').dropna().astype('int64')
+        rows = rows.loc[ids.index]
+        created = (ids // (1 << 22) + TWITTER_EPOCH_MS) // 1000
+        buckets = (created // self.bucket * self.bucket).astype(str)
+        texts = rows["Texto"].str.lower()
+
+        # Cada hashtag conta uma vez por tweet
+        hashtags = texts.str.findall(HASHTAG_PATTERN).explode().dropna()
+        hashtags = hashtags[~pd.Series(zip(hashtags.index, hashtags.values), index=hashtags.index).duplicated()]
+        counts = [pd.DataFrame({'bucket': buckets.loc[hashtags.index].values, 'term': hashtags.values})]
+        for term in self.terms:
+            mentioned = texts.str.contains(term.lower(), regex=False)
+            counts.append(pd.DataFrame({'bucket': buckets[mentioned].values, 'term': term}))
+
+        counts = pd.concat(counts, ignore_index=True)
+        return counts.groupby(['bucket', 'term']).size()
+
+    def _add(self, counts):
+        buckets, totals = self._state['buckets'], self._state['totals']
+        for (bucket, term), count in counts.items():
+            bucket_counts = buckets.setdefault(bucket, {})
+            bucket_counts[term] = bucket_counts.get(term, 0) + int(count)
+            totals[term] = totals.get(term, 0) + int(count)
+
+    # Tira da janela os baldes antigos, subtraindo suas contagens do total
+    def _expire(self, now):
+        buckets, totals = self._state['buckets'], self._state['totals']
+        cutoff = now - self.window
+        for bucket in [bucket for bucket in buckets if int(bucket) + self.bucket <= cutoff]:
+            for term, count in buckets.pop(bucket).items():
+                remaining = totals.get(term, 0) - count
+                if remaining > 0:
+                    totals[term] = remaining
+                else:
+                    totals.pop(term, None)
+
+    # Lê os tweets novos dos arquivos e atualiza as contagens da janela atual
+    def update(self, filenames):
+        self._load()
+        new_rows = 0
+        for filename in filenames:
+            if not os.path.exists(filename):
+                continue
+            rows = self._read_new_rows(filename)
+            if not rows.empty:
+                self._add(self._count(rows))
+                new_rows += len(rows)
+        self._expire(time.time())
+        self._save()
+        logger.info(f"Termos dos tweets: {new_rows} tweets novos, {len(self._state['totals'])} termos na janela.")
+
+    def window_counts(self, top=None, minimum=1):
+        totals = pd.Series(self._load()['totals'], dtype='int64')
+        totals = totals[totals >= minimum].sort_values(ascending=False, kind='stable')
+        if top is not None:
+            totals = totals.head(top)
+        return pd.DataFrame({"Hashtag": totals.index, "Contagem": totals.values})
+
+
+def tweet_files():
+    filenames = []
+    for pattern in config.TWEET_TERMS_ARQUIVOS:
+        filenames.extend(sorted(glob.glob(pattern)))
+    return filenames
+
+
+_aggregator = None
+
+
+def get_aggregator():
+    global _aggregator
+    if _aggregator is None:
+        from gettopproductsstate import produtos_populares
+        _aggregator = TweetTermsAggregator(config.TWEET_TERMS_STATE_FILE, config.TWEET_TERMS_JANELA,
+                                           config.TWEET_TERMS_BALDE, produtos_populares)
+    return _aggregator
+
+
+# Atualiza as contagens com os tweets do último ciclo e republica o all_trends
+def execute_tweet_terms():
+    import gethashtags
+
+    aggregator = get_aggregator()
+    aggregator.update(tweet_files())
+    terms = aggregator.window_counts(top=config.TWEET_TERMS_TOP, minimum=config.TWEET_TERMS_MINIMO)
+    gethashtags.save_tweet_terms(terms)
+
+
+if __name__ == "__main__":
+    botlogging.configure_logging("tweetterms")
+    execute_tweet_terms()
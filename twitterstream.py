@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import threading
+
+import requests
+
+import botlogging
+import config
+import httpsession
+import metrics
+from gettwitterposts import bearer_oauth, hashtags_query, mentions_query, save_to_tsv, update_cursor
+
+logger = logging.getLogger(__name__)
+
+rules_url = f"{config.TWITTER_API_BASE_URL}/2/tweets/search/stream/rules"
+stream_url = f"{config.TWITTER_API_BASE_URL}/2/tweets/search/stream"
+
+STREAM_PARAMS = {
+    'tweet.fields': 'created_at,author_id,text',
+    'expansions': 'author_id',
+    'user.fields': 'username',
+}
+
+
+class StreamTarget:
+    """ Regra do filtered stream e o arquivo (e cursor da busca recente) que recebem seus tweets. """
+
+    def __init__(self, tag, query, filename):
+        self.tag = tag
+        self.query = query
+        self.filename = filename
+
+
+# As mesmas consultas e arquivos da coleta periódica da busca recente
+def stream_targets(username="casasbahia", hashtags=("blackfriday",)):
+    targets = []
+    if username:
+        targets.append(StreamTarget(f"mentions:{username}", mentions_query(username),
+                                    os.path.join(config.X_TSV_FOLDER_IN, f"{username}_mentions.tsv")))
+    if hashtags:
+        targets.append(StreamTarget("hashtags", hashtags_query(list(hashtags)), "hashtags_tweets.tsv"))
+    return targets
+
+
+def _check(response):
+    metrics.record_request('twitter', '/2/tweets/search/stream/rules', response.status_code,
+                           response.elapsed.total_seconds())
+    response.raise_for_status()
+    return response.json()
+
+
+# Deixa as regras do stream iguais às consultas configuradas: remove as que sobram e inclui as que faltam
+def sync_rules(session, targets):
+    current = _check(session.get(rules_url, auth=bearer_oauth, timeout=30)).get('data', [])
+    wanted = {(target.query, target.tag) for target in targets}
+
+    stale = [rule['id'] for rule in current if (rule['value'], rule.get('tag')) not in wanted]
+    if stale:
+        _check(session.post(rules_url, auth=bearer_oauth, json={'delete': {'ids': stale}}, timeout=30))
+        logger.info(f"{len(stale)} regras antigas removidas do stream.")
+
+    existing = {(rule['value'], rule.get('tag')) for rule in current}
+    missing = [{'value': query, 'tag': tag} for query, tag in sorted(wanted - existing)]
+    if missing:
+        _check(session.post(rules_url, auth=bearer_oauth, json={'add': missing}, timeout=30))
+        logger.info(f"Regras incluídas no stream: {', '.join(rule['tag'] for rule in missing)}.")
+
+
+class StreamBuffer:
+    """
+    Tweets recebidos pelo stream, agrupados por regra e gravados em lote por uma thread própria
+    a cada poucos segundos; a leitura da conexão nunca espera pelo disco.
+    """
+
+    def __init__(self, targets, flush_interval):
+        self.targets = {target.tag: target for target in targets}
+        self.flush_interval = flush_interval
+        self._pending = {tag: [] for tag in self.targets}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='twitter-stream-flush', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add(self, tweet, tags):
+        with self._lock:
+            for tag in tags:
+                if tag in self._pending:
+                    self._pending[tag].append(tweet)
+
+    def flush(self):
+        with self._lock:
+            pending = {tag: tweets for tag, tweets in self._pending.items() if tweets}
+            self._pending = {tag: [] for tag in self.targets}
+        for tag, tweets in pending.items():
+            target = self.targets[tag]
+            # save_to_tsv espera a ordem da API (mais novo primeiro)
+            tweets = sorted(tweets, key=lambda tweet: int(tweet['id']), reverse=True)
+            save_to_tsv(tweets, target.filename)
+            # Mantém o cursor da busca recente em dia, para a coleta periódica continuar sem lacunas
+            update_cursor(target.query, tweets)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar tweets do stream: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+
+# Lê a conexão até ela cair; devolve quantos tweets chegaram
+def _consume(response, buffer, stop_event):
+    received = 0
+    for line in response.iter_lines(chunk_size=1):
+        if stop_event.is_set():
+            break
+        if not line:
+            continue  # keep-alive
+        message = json.loads(line)
+        tweet = message.get('data')
+        if not tweet:
+            if 'errors' in message:
+                logger.warning(f"Mensagem de erro do stream: {message['errors']}")
+            continue
+        users = {user['id']: user['username'] for user in message.get('includes', {}).get('users', [])}
+        tweet['author_username'] = f"@{users.get(tweet.get('author_id'), 'desconhecido')}"
+        buffer.add(tweet, [rule.get('tag') for rule in message.get('matching_rules', [])])
+        metrics.inc('cb_twitter_stream_tweets_total')
+        received += 1
+    return received
+
+
+# Espera da reconexão, conforme o tipo de falha: rede (linear, curta), HTTP (exponencial) e 429 (exponencial, longa)
+def reconnect_delay(kind, failures):
+    if kind == 'network':
+        return min(0.25 * failures, 16)
+    if kind == '429':
+        return min(60 * 2 ** (failures - 1), 15 * 60)
+    return min(5 * 2 ** (failures - 1), 320)
+
+
+# Modo stream: uma conexão persistente com o filtered stream, reconectando com backoff até stop_event
+def run_stream(username="casasbahia", hashtags=("blackfriday",), stop_event=None, max_seconds=None):
+    stop_event = stop_event or threading.Event()
+    if max_seconds is not None:
+        threading.Timer(max_seconds, stop_event.set).start()
+
+    targets = stream_targets(username, hashtags)
+    os.makedirs(config.X_TSV_FOLDER_IN, exist_ok=True)
+    session = httpsession.create_session(pool_size=1)
+    buffer = StreamBuffer(targets, config.TWITTER_STREAM_GRAVACAO).start()
+    failures = 0
+    rules_synced = False
+    try:
+        while not stop_event.is_set():
+            kind = None
+            try:
+                if not rules_synced:
+                    sync_rules(session, targets)
+                    rules_synced = True
+                with session.get(stream_url, auth=bearer_oauth, params=STREAM_PARAMS, stream=True,
+                                 timeout=(10, config.TWITTER_STREAM_TIMEOUT_LEITURA)) as response:
+                    metrics.record_request('twitter', '/2/tweets/search/stream', response.status_code,
+                                           response.elapsed.total_seconds())
+                    if response.status_code == 200:
+                        logger.info("Conectado ao filtered stream.")
+                        if _consume(response, buffer, stop_event):
+                            failures = 0
+                        kind = 'network'  # O servidor encerrou a conexão
+                    else:
+                        kind = '429' if response.status_code == 429 else 'http'
+                        logger.warning(f"Stream respondeu {response.status_code}: {response.text[:200]}")
+            except requests.HTTPError as e:
+                kind = '429' if e.response.status_code == 429 else 'http'
+                logger.warning(f"Erro ao sincronizar as regras do stream: {e}")
+            except (requests.RequestException, ValueError) as e:
+                kind = 'network'
+                logger.warning(f"Conexão com o stream caiu: {e}")
+
+            if stop_event.is_set():
+                break
+            failures += 1
+            delay = reconnect_delay(kind, failures)
+            metrics.inc('cb_http_retries_total', {'service': 'twitter_stream', 'reason': kind})
+            logger.info(f"Reconectando ao stream em {delay:.2f}s.")
+            stop_event.wait(delay)
+    finally:
+        buffer.stop()
+        session.close()
+    logger.info("Stream encerrado.")
+
+
+if __name__ == "__main__":
+    botlogging.configure_logging("twitterstream")
+    run_stream()
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import config
+from jobdeadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """
+    Fila de unidades de trabalho em SQLite, compartilhada entre processos. Um worker reserva
+    uma unidade por um tempo (lease); se não concluir dentro do prazo, a unidade volta a ficar
+    disponível. Falhas são tentadas de novo até o limite de tentativas.
+    """
+
+    def __init__(self, path, lease_seconds, max_attempts):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # isolation_level=None: as transações são abertas explicitamente com BEGIN IMMEDIATE
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30,
+                                               isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS units (
+                    job TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    result BLOB,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job, key)
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_units_status ON units (job, status)")
+        return self._connection
+
+    # Inclui as unidades na fila. Unidades já encerradas com a mesma chave (deixadas por um coordenador
+    # anterior que caiu) voltam a ficar pendentes: o resultado antigo ignoraria a validade do cache, e
+    # uma falha antiga nunca seria tentada de novo. Unidades pendentes ou em andamento são mantidas.
+    def submit(self, job, units):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT INTO units (job, key, payload, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (job, key) DO UPDATE SET payload = excluded.payload, status = excluded.status, "
+                "attempts = 0, worker = NULL, lease_expires = NULL, result = NULL, error = NULL, "
+                "updated_at = excluded.updated_at WHERE units.status IN (?, ?)",
+                [(job, key, json.dumps(payload, ensure_ascii=False), PENDING, now, DONE, FAILED)
+                 for key, payload in units.items()])
+            connection.execute("COMMIT")
+
+    # Reserva a próxima unidade disponível (pendente ou com lease vencido) para o worker
+    def claim(self, job, worker):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT key, payload, attempts FROM units WHERE job = ? AND "
+                    "(status = ? OR (status = ? AND lease_expires < ?)) ORDER BY updated_at LIMIT 1",
+                    (job, PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE units SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE job = ? AND key = ?",
+                    (LEASED, worker, now + self.lease_seconds, now, job, row[0]))
+            finally:
+                connection.execute("COMMIT")
+        return {'job': job, 'key': row[0], 'payload': json.loads(row[1]), 'attempt': row[2] + 1}
+
+    def _finish(self, unit, worker, status, result=None, error=None):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            # Só o dono do lease grava o resultado; um lease vencido e reassumido por outro worker é ignorado
+            cursor = connection.execute(
+                "UPDATE units SET status = ?, result = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE job = ? AND key = ? AND status = ? AND worker = ?",
+                (status, result, error, time.time(), unit['job'], unit['key'], LEASED, worker))
+            connection.execute("COMMIT")
+        return cursor.rowcount > 0
+
+    def complete(self, unit, worker, result):
+        return self._finish(unit, worker, DONE, result=pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def fail(self, unit, worker, error):
+        status = FAILED if unit['attempt'] >= self.max_attempts else PENDING
+        return self._finish(unit, worker, status, error=str(error))
+
+    # Devolve a unidade à fila sem contar a tentativa (ex.: o worker foi interrompido)
+    def release(self, unit, worker):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE units SET status = ?, attempts = attempts - 1, lease_expires = NULL, updated_at = ? "
+                "WHERE job = ? AND key = ? AND status = ? AND worker = ?",
+                (PENDING, time.time(), unit['job'], unit['key'], LEASED, worker))
+            connection.execute("COMMIT")
+
+    # Unidades já encerradas entre as chaves informadas: chave -> (status, resultado, erro)
+    def finished(self, job, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT key, status, result, error FROM units WHERE job = ? AND status IN (?, ?) "
+                f"AND key IN ({placeholders})", [job, DONE, FAILED] + keys).fetchall()
+        return {key: (status, pickle.loads(result) if result is not None else None, error)
+                for key, status, result, error in rows}
+
+    # Remove da fila as unidades cujo resultado já foi consumido pelo coordenador
+    def forget(self, job, keys):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("DELETE FROM units WHERE job = ? AND key = ?", [(job, key) for key in keys])
+            connection.execute("COMMIT")
+
+    def stats(self, job):
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) FROM units WHERE job = ? GROUP BY status", (job,)).fetchall()
+        return dict(rows)
+
+
+# Reserva e executa uma unidade; devolve False quando a fila não tem nada disponível
+def work_one(queue, job, handler, worker):
+    unit = queue.claim(job, worker)
+    if unit is None:
+        return False
+    try:
+        result = handler(unit['payload'])
+    except DeadlineExceeded:
+        queue.release(unit, worker)
+        raise
+    except Exception as e:
+        logger.error(f"Worker {worker}: erro na unidade {unit['key']} (tentativa {unit['attempt']}): {e}")
+        queue.fail(unit, worker, e)
+    else:
+        if not queue.complete(unit, worker, result):
+            logger.warning(f"Worker {worker}: lease da unidade {unit['key']} venceu antes da conclusão.")
+    return True
+
+
+# Laço de um processo worker; idle_exit encerra depois de tantos segundos sem trabalho
+def run_worker(queue, job, handler, worker, poll_interval, idle_exit=None):
+    logger.info(f"Worker {worker} aguardando unidades de '{job}' em {queue.path}.")
+    idle_since = time.monotonic()
+    while True:
+        if work_one(queue, job, handler, worker):
+            idle_since = time.monotonic()
+            continue
+        if idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+            logger.info(f"Worker {worker} sem trabalho há {idle_exit}s; encerrando.")
+            return
+        time.sleep(poll_interval)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+# Fila única do processo para as consultas ao Google Trends
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WorkQueue(config.TRENDS_FILA_DB, config.TRENDS_FILA_LEASE, config.TRENDS_FILA_TENTATIVAS)
+        return _queue